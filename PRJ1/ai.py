@@ -1,22 +1,172 @@
 import random
 import math
+import time
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
 
-from mcts import MCTSNode
+import movegen
+from book import OpeningBook, BOOK_FILE, BOOK_DEPTH, BOOK_STRATEGY
+from endgame import EndgameSolver, WIN, LOSS
+from evaluation import WeightedEvaluator, DEFAULT_WEIGHTS, DEFAULT_NOISE
+from mcts import MCTSNode, SELECTION_POLICIES
+from packed_state import PackedGameState
+from rollout import BatchRollouts, MAX_ROLLOUT_STEPS, PLAYOUT_POLICIES, DEFAULT_PLAYOUT_TEMPERATURE, heuristic_move, \
+    check_temperature
+from search_log import get_logger, TRACE
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from zobrist import search_key, SIDE_KEYS
+
+
+# per-move budgets used when a difficulty is played on the clock instead of at a fixed depth
+DIFFICULTY_TIME_BUDGETS_MS = {'Easy': 200, 'Medium': 1000, 'Hard': 3000}
+MAX_SEARCH_DEPTH = 32
+DEFAULT_MCTS_ITERATIONS = 100
+MCTS_REUSE_PLIES = 2  # how deep the kept MCTS tree is searched for the new position: our move + the reply
+_NO_LOCK = nullcontext()
+
+log = get_logger('ai')
+
+
+class SearchTimeout(Exception):
+    pass
 
 
 class AI:
-    def __init__(self, strategy='MiniMax', difficulty='Medium'):
+    def __init__(self, strategy='MiniMax', difficulty='Medium', use_transposition_table=True, tt_size=1 << 16,
+                 time_budget_ms=None, timed=False, move_ordering=True, workers=1, mcts_iterations=None,
+                 mcts_workers=1, mcts_mode='root', virtual_loss=1, mcts_reuse_tree=True,
+                 mcts_exploration=math.sqrt(2), mcts_selection='ucb1', trace_every=100, mcts_rollouts=1,
+                 mcts_playout=None, playout_temperature=DEFAULT_PLAYOUT_TEMPERATURE, check_features=False,
+                 evaluation_weights=DEFAULT_WEIGHTS, evaluation_noise=DEFAULT_NOISE, opening_book=None,
+                 endgame_solver=None):
         self.strategy = strategy
         self.difficulty = difficulty
         self.max_depth = 2
         self.max_depth = 2 if difficulty == 'Medium' else (1 if difficulty == 'Easy' else 3)
+        # MiniMax/AlphaBeta deepen (and MCTS plays out) until the budget runs out when one is set, either directly,
+        # as a numeric difficulty in milliseconds, or from the difficulty name with timed=True
+        if isinstance(difficulty, (int, float)):
+            time_budget_ms = difficulty
+        elif timed and time_budget_ms is None:
+            time_budget_ms = DIFFICULTY_TIME_BUDGETS_MS.get(difficulty, DIFFICULTY_TIME_BUDGETS_MS['Medium'])
+        self.time_budget_ms = time_budget_ms
+        self.deadline = None
+        self.stopped = False  # set by stop() from another thread, the search then ends at its next node or playout
+        self.last_search_depth = 0
+        # only the AlphaBeta search reads the table, it is kept between moves of the same game
+        self.transposition_table = None
+        if use_transposition_table and strategy == 'AlphaBeta':
+            self.transposition_table = TranspositionTable(tt_size)
+        # AlphaBeta move ordering: table move, then captures, killer moves and history scores
+        self.move_ordering = move_ordering
+        self.killer_moves = {}  # ply -> up to two quiet moves that caused a beta cutoff
+        self.history = {}  # (player, move) -> sum of depth^2 over the cutoffs it caused
+        self.root_depth = 0
+        # consistency check mode: every evaluation first compares the incremental features to a full scan
+        self.check_features = check_features
+        # AlphaBeta leaf evaluation: weights over evaluation.FEATURES, or a weights file from tune.py; MiniMax
+        # scores its leaves with evaluate_state_simpler and does not read them
+        self.evaluator = WeightedEvaluator(evaluation_weights, evaluation_noise)
+        self.nodes = 0  # nodes visited by the last MiniMax/AlphaBeta search
+        # choose_move plays the opening book move when the position is in the book (a path or an OpeningBook,
+        # False to always search); the file is only read on the first probe. By default (None) only the shipped
+        # book's own strategy at a fixed depth at least as deep as its searches plays it: weaker difficulties,
+        # timed searches, MiniMax (another evaluation) and MCTS play their own openings
+        if opening_book is None:
+            opening_book = BOOK_FILE if strategy == BOOK_STRATEGY and self.time_budget_ms is None and \
+                self.max_depth >= BOOK_DEPTH else False
+        self.opening_book = OpeningBook(opening_book) if isinstance(opening_book, str) else opening_book or None
+        self.book_hit = False  # the last choose_move came from the book
+        # positions with few stacks left are first given to the exact solver, a proven win is played without
+        # searching; its proven positions are kept for the rest of the game. By default (None) only Hard
+        # MiniMax/AlphaBeta use it, at a fixed depth or on the Hard clock, so the easier levels still miss wins
+        if endgame_solver is None:
+            endgame_solver = strategy in ('MiniMax', 'AlphaBeta') and (
+                self.max_depth >= 3 if self.time_budget_ms is None
+                else self.time_budget_ms >= DIFFICULTY_TIME_BUDGETS_MS['Hard'])
+        self.endgame_solver = EndgameSolver() if endgame_solver else None
+        self.endgame_result = None  # WIN, LOSS or UNKNOWN when the last choose_move tried the solver
+        # moves searched by ponder() for the positions after the opponent's likely replies, Zobrist key with the
+        # player to move -> move; choose_move plays them without searching again
+        self.ponder_moves = {}
+        self.ponder_hit = False  # the last choose_move came from ponder_moves
+        # root moves are split over a process pool when workers > 1, see search_root_parallel
+        self.workers = workers
+        self.worker_config = {'strategy': strategy, 'difficulty': difficulty, 'move_ordering': move_ordering,
+                              'use_transposition_table': use_transposition_table, 'tt_size': tt_size,
+                              'check_features': check_features, 'evaluation_weights': self.evaluator.weights,
+                              'evaluation_noise': evaluation_noise}
+        self.executor = None
+        self.search_id = 0
+        # MCTS: with mcts_workers > 1, 'root' runs independent trees in the process pool and merges the
+        # root statistics, the parallel speed-up; 'tree' shares one tree between threads using virtual loss,
+        # which the GIL keeps to one core: it spreads the search like a parallel one but is not faster
+        if mcts_mode not in ('root', 'tree'):
+            raise ValueError(f"Unknown MCTS mode: {mcts_mode}")
+        self.mcts_iterations = mcts_iterations
+        self.mcts_workers = mcts_workers
+        self.mcts_mode = mcts_mode
+        self.virtual_loss = virtual_loss
+        self.playouts = 0  # playouts run by the last MCTS search
+        self.mcts_reuse_tree = mcts_reuse_tree
+        self.mcts_root = None  # tree of the last MCTS search, re-rooted at the next turn
+        self.mcts_root_state = None  # position of mcts_root, the tree nodes do not keep states
+        if mcts_selection not in SELECTION_POLICIES:
+            raise ValueError(f"Unknown MCTS selection policy: {mcts_selection}")
+        self.mcts_exploration = mcts_exploration
+        self.mcts_selection = mcts_selection
+        # random playouts per MCTS leaf; more than one runs them as a batch in rollout.BatchRollouts
+        self.mcts_rollouts = max(1, mcts_rollouts)
+        # playout policy: 'random' moves, or 'heuristic' softmax over evaluate_state deltas, the default of
+        # the 'Variation of MCTS' strategy
+        if mcts_playout is None:
+            mcts_playout = 'heuristic' if strategy == 'Variation of MCTS' else 'random'
+        if mcts_playout not in PLAYOUT_POLICIES:
+            raise ValueError(f"Unknown playout policy: {mcts_playout}")
+        self.mcts_playout = mcts_playout
+        check_temperature(playout_temperature)
+        self.playout_temperature = playout_temperature
+        self.mcts_depth = 0  # deepest tree node reached by the last MCTS search
+        self.search_time = 0.0
+        # with the 'ia' logger at TRACE level, one MCTS iteration in trace_every is traced
+        self.trace_every = max(1, trace_every)
+        self.worker_config.update({'mcts_iterations': mcts_iterations, 'virtual_loss': virtual_loss,
+                                   'mcts_reuse_tree': mcts_reuse_tree, 'mcts_exploration': mcts_exploration,
+                                   'mcts_selection': mcts_selection, 'trace_every': trace_every,
+                                   'mcts_rollouts': mcts_rollouts, 'mcts_playout': mcts_playout,
+                                   'playout_temperature': playout_temperature})
 
     def choose_move(self, game_state, player_number):
+        start = time.perf_counter()
+        move = self.book_move(game_state, player_number)
+        self.book_hit = move is not None
+        if move is None:
+            move = self.endgame_move(game_state, player_number)
+        # a pondered move stands in for the search only, the book and the solver still come first
+        self.ponder_hit = False
+        if move is None:
+            move = self.pondered_move(game_state, player_number)
+            self.ponder_hit = move is not None
+        if move is not None:
+            self.nodes = self.playouts = 0
+        else:
+            move = self.search_move(game_state, player_number)
+        self.search_time = time.perf_counter() - start
+        if log.isEnabledFor(logging.INFO):
+            log.info("%s player %d: %s, %s", self.strategy, player_number, move,
+                     ', '.join(f"{name} {value}" for name, value in self.search_stats().items()
+                               if name not in ('strategy', 'move')))
+        return move
+
+    def search_move(self, game_state, player_number):
+        # the strategy's search alone, for choose_move and ponder: no book, solver or pondered moves and no log
         if self.strategy == 'MiniMax':
-            print("Minimax strategy ", player_number)
             return self.choose_minimax_move(game_state, player_number)
         elif self.strategy == 'AlphaBeta':
-            print("AlphaBeta strategy ", player_number)
+            if self.transposition_table is not None:
+                self.transposition_table.new_search()
             return self.choose_minimax_move(game_state, player_number, use_alpha_beta=True)
         elif self.strategy == 'MCTS':
             return self.mcts(game_state, player_number)
@@ -25,233 +175,627 @@ class AI:
         else:
             raise ValueError(f"Unknown strategy: {self.strategy}")
 
+    def search_stats(self):
+        # counters of the last choose_move, for logging, benchmarks and the GUI instead of prints
+        stats = {'strategy': self.strategy, 'time': round(self.search_time, 4)}
+        if self.strategy in ('MiniMax', 'AlphaBeta'):
+            stats.update({'nodes': self.nodes, 'depth': self.last_search_depth})
+            if self.transposition_table is not None:
+                stats['tt_hit_rate'] = round(self.transposition_table.stats()['hit_rate'], 3)
+        else:
+            stats.update({'playouts': self.playouts, 'depth': self.mcts_depth})
+        if self.book_hit:
+            stats['book'] = True
+        if self.ponder_hit:
+            stats['ponder'] = True
+        if self.endgame_result in (WIN, LOSS):
+            stats['endgame'] = 'win' if self.endgame_result == WIN else 'loss'
+        return stats
+
+    def book_move(self, game_state, player_number):
+        # the best opening book move of the position, a random one of them on a tie, None when not in the book
+        if self.opening_book is None:
+            return None
+        moves = self.opening_book.probe(game_state, player_number)
+        if not moves:
+            return None
+        best_score = moves[0][1]
+        return random.choice([move for move, score in moves if score == best_score])
+
+    def pondered_move(self, game_state, player_number):
+        move = self.ponder_moves.pop(game_state.hash ^ SIDE_KEYS[player_number], None)
+        if move is None or move not in self.get_valid_moves(game_state, player_number):
+            return None
+        return move
+
+    def ponder(self, game_state, player_number):
+        # Searches on the opponent's time until stop(); player_number is this AI, the opponent is to move.
+        # MCTS keeps growing the tree of the current position, and choose_move re-roots it at the reply
+        # played (mcts_root_for). MiniMax/AlphaBeta search the positions after the opponent's replies, most
+        # likely first by their evaluation for the opponent: a finished search goes to ponder_moves, and with
+        # AlphaBeta its transposition table entries also speed up the search of a reply that was not finished.
+        # The counters of the last choose_move are kept for search_stats, and nothing is logged per reply.
+        self.ponder_moves = {}
+        counters = (self.nodes, self.playouts, self.last_search_depth, self.mcts_depth)
+        try:
+            self.ponder_replies(game_state, player_number)
+        finally:
+            self.nodes, self.playouts, self.last_search_depth, self.mcts_depth = counters
+
+    def ponder_replies(self, game_state, player_number):
+        opponent = 3 - player_number
+        if self.strategy in ('MCTS', 'Variation of MCTS'):
+            if self.mcts_reuse_tree:
+                search_state = game_state if isinstance(game_state, PackedGameState) else \
+                    PackedGameState.from_game_state(game_state)
+                self.run_mcts(search_state, opponent)
+            return
+        replies = []
+        for reply in self.get_valid_moves(game_state, opponent):
+            child = game_state.copy()
+            child.make_move(reply, opponent)
+            if child.has_valid_moves(player_number):
+                replies.append((self.evaluate_state(child, opponent), child))
+        replies.sort(key=lambda item: -item[0])
+        for _, child in replies:
+            try:
+                move = self.search_move(child, player_number)
+            except SearchTimeout:
+                return
+            if self.stopped:
+                return  # an iterative deepening search cut short, not worth keeping
+            self.ponder_moves[child.hash ^ SIDE_KEYS[player_number]] = move
+
+    def endgame_move(self, game_state, player_number):
+        # the winning move when the endgame solver proves the position won, None to search as usual; a proven
+        # loss is still searched, the opponent may not find its win
+        self.endgame_result = None
+        if self.endgame_solver is None or not self.endgame_solver.applies(game_state):
+            return None
+        self.endgame_result, move = self.endgame_solver.solve(game_state, player_number)
+        return move if self.endgame_result == WIN else None
+
+    def score_root_moves(self, game_state, player_number, depth=None, use_alpha_beta=True):
+        # [(score, move)] of every root move, best first; each move gets a full window search, so unlike
+        # search_root the scores are exact and comparable (build_book.py keeps the best few)
+        depth = self.max_depth if depth is None else depth
+        self.search_id += 1
+        self.nodes = 0
+        self.killer_moves = {}
+        self.history = {}
+        self.root_depth = depth
+        if self.transposition_table is not None:
+            self.transposition_table.new_search()
+        search_state = game_state.copy()
+        scores = []
+        for move in self.get_valid_moves(search_state, player_number):
+            search_state.push_move(move, player_number)
+            if use_alpha_beta:
+                eval = self.minimax_alpha_beta(search_state, depth, player_number, -math.inf, math.inf, True)
+            else:
+                eval = self.minimax(search_state, depth, player_number, True)
+            search_state.pop_move()
+            scores.append((eval, move))
+        scores.sort(key=lambda item: -item[0])
+        return scores
+
     def choose_minimax_move(self, game_state, player_number, use_alpha_beta=False):
+        self.search_id += 1
+        self.nodes = 0
+        self.killer_moves = {}
+        self.history = {}
+        if self.time_budget_ms is not None:
+            return self.iterative_deepening(game_state, player_number, use_alpha_beta)
+        # a single working copy for the whole search, children are visited with push_move/pop_move
+        search_state = game_state.copy()
+        root_moves = self.get_valid_moves(search_state, player_number)
+        self.last_search_depth = self.max_depth
+        best_move = self.search_root(search_state, root_moves, self.max_depth, player_number, use_alpha_beta)
+        # None when every root move scores -inf (the mover is left without a move further down every line)
+        return best_move or (root_moves[0] if root_moves else None)
+
+    def search_root(self, search_state, root_moves, depth, player_number, use_alpha_beta=False):
+        if self.workers > 1 and len(root_moves) > 1:
+            return self.search_root_parallel(search_state, root_moves, depth, player_number, use_alpha_beta)
         best_eval = -math.inf
         best_move = None
-        for move in self.get_valid_moves(game_state, player_number):
-            game_state_copy = game_state.copy()
-            game_state_copy.make_move(move,
-                                      player_number)
+        self.root_depth = depth
+        for move in root_moves:
+            search_state.push_move(move, player_number)
             if use_alpha_beta:
-                eval = self.minimax_alpha_beta(game_state_copy, self.max_depth, player_number, -math.inf, math.inf,
+                eval = self.minimax_alpha_beta(search_state, depth, player_number, -math.inf, math.inf,
                                                True)
             else:
-                eval = self.minimax(game_state_copy, self.max_depth, player_number, True)
+                eval = self.minimax(search_state, depth, player_number, True)
+            search_state.pop_move()
             if eval > best_eval:
                 best_eval = eval
                 best_move = move
         return best_move
 
+    def search_root_parallel(self, search_state, root_moves, depth, player_number, use_alpha_beta=False):
+        # Root moves go to the pool in batches of `workers`. Each batch is searched with the best value of the
+        # batches before it as alpha, and results are merged in root move order, so the chosen move is the one
+        # the serial search_root picks.
+        executor = self.get_executor()
+        best_eval = -math.inf
+        best_move = None
+        for start in range(0, len(root_moves), self.workers):
+            batch = root_moves[start:start + self.workers]
+            time_left = None if self.deadline is None else self.deadline - time.perf_counter()
+            futures = [executor.submit(_search_root_move, search_state, move, depth, player_number,
+                                            use_alpha_beta, best_eval, time_left, self.search_id)
+                       for move in batch]
+            for move, future in zip(batch, futures):
+                eval, nodes = future.result()
+                self.nodes += nodes
+                if eval is None:
+                    raise SearchTimeout()
+                if eval > best_eval:
+                    best_eval = eval
+                    best_move = move
+        return best_move
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=max(self.workers, self.mcts_workers),
+                                                initializer=_init_search_worker, initargs=(self.worker_config,))
+        return self.executor
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def iterative_deepening(self, game_state, player_number, use_alpha_beta=False):
+        # Searches depth 0, 1, 2... until the time budget runs out and keeps the move of the last finished depth.
+        # A depth that hits the deadline is abandoned halfway, so its working copy is thrown away with it.
+        start = time.perf_counter()
+        self.deadline = start + self.time_budget_ms / 1000
+        root_moves = self.get_valid_moves(game_state, player_number)
+        best_move = root_moves[0] if root_moves else None
+        self.last_search_depth = 0
+        try:
+            # depth counts the plies after the root move, as max_depth does, so depth 0 is a one ply search
+            for depth in range(0, MAX_SEARCH_DEPTH + 1):
+                if not root_moves or time.perf_counter() >= self.deadline:
+                    break
+                # the previous best move is searched first
+                root_moves.remove(best_move)
+                root_moves.insert(0, best_move)
+                # search_root returns None when every root move scores -inf, the previous depth's move is kept
+                best_move = self.search_root(game_state.copy(), root_moves, depth, player_number,
+                                             use_alpha_beta) or best_move
+                self.last_search_depth = depth
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline = None
+        return best_move
+
+    def check_deadline(self):
+        self.nodes += 1
+        if self.stopped or (self.deadline is not None and time.perf_counter() >= self.deadline):
+            raise SearchTimeout()
+
+    def stop(self):
+        # ends a choose_move running on another thread (ai_worker.AISearch): a timed search returns the move of
+        # its last finished depth, MCTS the best move so far, a fixed depth search raises SearchTimeout
+        self.stopped = True
+
     def mcts(self, game_state, player_number):
-        root_node = MCTSNode(game_state=game_state, player_number=player_number)
-        for iteration in range(100):
-            print(f"Iteration: {iteration + 1}")
+        # Runs mcts_iterations iterations (mcts_rollouts playouts each), or as many as fit in time_budget_ms
+        # when a budget is set (mcts_iterations then only caps the count).
+        iterations = self.mcts_iterations
+        deadline = None
+        if self.time_budget_ms is not None:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+        elif iterations is None:
+            iterations = DEFAULT_MCTS_ITERATIONS
+        self.playouts = 0
+        self.mcts_depth = 0
+        # iterations replay the tree path from the root, on the byte-packed engine that is a 64 byte copy
+        search_state = game_state if isinstance(game_state, PackedGameState) else \
+            PackedGameState.from_game_state(game_state)
+
+        if self.mcts_workers > 1 and self.mcts_mode == 'tree':
+            root_node = self.run_mcts_tree_parallel(search_state, player_number, iterations, deadline)
+            statistics = self.root_statistics(root_node)
+        elif self.mcts_workers > 1:
+            statistics = self.run_mcts_root_parallel(search_state, player_number, iterations, deadline)
+        else:
+            root_node = self.run_mcts(search_state, player_number, iterations, deadline)
+            statistics = self.root_statistics(root_node)
+
+        if statistics:
+            best_move = max(statistics, key=lambda move: statistics[move][0] / statistics[move][1])
+            log.debug("MCTS best root move %s (%.1f wins / %d visits)", best_move, *statistics[best_move])
+            return best_move
+        else:
+            log.debug("MCTS expanded no root child, choosing a random move")
+            possible_moves = self.get_valid_moves(game_state, player_number)
+            if possible_moves:
+                return random.choice(possible_moves)  # Choose a random move if possible
+            else:
+                return None
+
+    def run_mcts(self, game_state, player_number, iterations=None, deadline=None):
+        root_node = self.mcts_root_for(game_state, player_number)
+        self.playouts += self.mcts_loop(root_node, game_state, player_number, iterations, deadline)
+        return root_node
+
+    def mcts_root_for(self, game_state, player_number):
+        # The tree of the previous turn is kept; if the current position is in it (normally our last move
+        # followed by the opponent's reply) that node becomes the new root together with its statistics.
+        root_node = None
+        if self.mcts_reuse_tree and self.mcts_root is not None:
+            root_node = self.find_mcts_node(self.mcts_root, self.mcts_root_state, game_state, player_number)
+        if root_node is None:
+            root_node = MCTSNode(player_number=player_number)
+        root_node.detach()  # the rest of the old tree can be freed
+        self.mcts_root = root_node
+        self.mcts_root_state = game_state.copy()
+        return root_node
+
+    def find_mcts_node(self, node, node_state, game_state, player_number, max_plies=MCTS_REUSE_PLIES):
+        # nodes do not keep their state, so the kept tree is replayed from its root while looking
+        frontier = [(node, node_state)]
+        for _ in range(max_plies + 1):
+            for candidate, state in frontier:
+                if candidate.player_number == player_number and state.hash == game_state.hash \
+                        and state.board == game_state.board:
+                    return candidate
+            frontier = [(child, state.copy().make_move(child.move, candidate.player_number))
+                        for candidate, state in frontier for child in candidate.children]
+        return None
+
+    def mcts_loop(self, root_node, game_state, player_number, iterations=None, deadline=None, lock=None,
+                  virtual_loss=0, counter=None):
+        # Iterates until `iterations` iterations (shared through `counter` between tree-parallel threads) or
+        # the deadline, whichever comes first. Returns the number of playouts this call ran, mcts_rollouts
+        # per iteration.
+        count = 0
+        counter = counter if counter is not None else [0]
+        tracing = log.isEnabledFor(TRACE)
+        while not self.stopped and (deadline is None or time.perf_counter() < deadline):
+            with lock or _NO_LOCK:
+                if iterations is not None and counter[0] >= iterations:
+                    break
+                counter[0] += 1
+                iteration = counter[0]
+            trace = tracing and iteration % self.trace_every == 0
+            count += self.mcts_iteration(root_node, game_state, player_number, lock, virtual_loss, trace)
+        return count
+
+    def mcts_iteration(self, root_node, game_state, player_number, lock=None, virtual_loss=0, trace=False):
+        # One selection/expansion/simulation/backpropagation pass. Node wins are counted for the player who
+        # made the move into the node, which is what the parent maximises in select_child.
+        # With a lock (tree-parallel mode) the tree is only touched while holding it, and every node on the
+        # selected path carries a virtual loss until its result is backed up, steering other threads elsewhere.
+        with lock or _NO_LOCK:
             node = root_node
             state = game_state.copy()
+            node.visit(state)
 
             # Selection
             steps = 0
-            while not node.is_terminal_node() and node.untried_moves == []:
-                node = node.select_child()
-                state = state.make_move(node.move, player_number)
+            while not node.is_terminal_node() and node.untried_count() == 0:
+                node = node.select_child(self.mcts_exploration, self.mcts_selection)
+                state = state.make_move(node.move, node.parent.player_number)
+                node.visit(state)
+                node.add_virtual_loss(virtual_loss)
                 steps += 1
-            print(f"  Selection ended after {steps} steps.")
 
             # Expansion
-            if node.untried_moves:
-                print("  Expansion step.")
-                node = node.expand()
-
-            # Simulation
-            simulation_steps = 0
-            while  simulation_steps < 600:
-                possible_moves = self.get_valid_moves(state, player_number)
+            expanded = node.untried_count() > 0
+            if expanded:
+                node = node.expand(state)
+                state = state.make_move(node.move, node.parent.player_number)
+                node.visit(state)
+                node.add_virtual_loss(virtual_loss)
+            self.mcts_depth = max(self.mcts_depth, steps + expanded)
+
+        # Simulation, either one game played move by move or mcts_rollouts games in one NumPy batch
+        simulation_steps = 0
+        rollouts = self.mcts_rollouts
+        if rollouts > 1:
+            # a generator per call, seeded from `random`, so tree-parallel threads never share one
+            batch = BatchRollouts(random.getrandbits(64), policy=self.mcts_playout,
+                                  temperature=self.playout_temperature)
+            result = int(batch.run(state, node.player_number, player_number, rollouts).sum())
+        elif self.mcts_playout == 'heuristic':
+            state, simulation_steps = self.simulate_with_heuristic(state, node.player_number)
+            result = state.get_result(player_number)
+        else:
+            current_player = node.player_number
+            while simulation_steps < MAX_ROLLOUT_STEPS:
+                possible_moves = self.get_valid_moves(state, current_player)
                 if not possible_moves:
                     break  # Exit the simulation loop, as no further moves can be made
                 move = random.choice(possible_moves)
-                state = state.make_move(move, player_number)
+                state = state.make_move(move, current_player)
+                current_player = 3 - current_player
                 simulation_steps += 1
-            print(f"  Simulation ended after {simulation_steps} steps.")
+            result = state.get_result(player_number)
 
-            # Backpropagation
+        # Backpropagation, a batch counts as `rollouts` visits with its summed result
+        with lock or _NO_LOCK:
             backprop_steps = 0
-            result = state.get_result(player_number)
             while node is not None:
-                effective_result = result if node.player_number == player_number else -result
-                node.update(effective_result)
+                if node.parent is not None:
+                    node.add_virtual_loss(-virtual_loss)
+                effective_result = result if node.player_number != player_number else -result
+                node.update(effective_result, rollouts)
                 node = node.parent
                 backprop_steps += 1
-            print(f"  Backpropagation updated {backprop_steps} nodes.")
-
-        if root_node.children:
-            best_move = max(root_node.children, key=lambda c: c.wins / c.visits).move  # Updated to also consider visits
-            print(f"Best move chosen from root: {best_move}")
-            return best_move
+        if trace:
+            log.log(TRACE, "MCTS iteration: selection %d steps, expanded %s, %d rollouts (%d simulation steps), "
+                    "result %d, backpropagation %d nodes", steps, expanded, rollouts, simulation_steps, result,
+                    backprop_steps)
+        return rollouts
+
+    def root_statistics(self, root_node):
+        # move -> (wins, visits) of the root children, the form root-parallel workers send back
+        return {child.move: (float(child.wins), int(child.visits)) for child in root_node.children if child.visits}
+
+    def run_mcts_root_parallel(self, game_state, player_number, iterations=None, deadline=None):
+        # Independent trees in the process pool, iterations split between them; child statistics are summed
+        # move by move and merged in a fixed order so the result does not depend on which worker finished first.
+        executor = self.get_executor()
+        if iterations is None:
+            shares = [None] * self.mcts_workers
         else:
-            print("No children nodes were expanded, choosing a random or default move.")
-            possible_moves = self.get_valid_moves(game_state, player_number)
-            if possible_moves:
-                return random.choice(possible_moves)  # Choose a random move if possible
-            else:
-                return None
-
-
+            shares = [iterations // self.mcts_workers + (1 if i < iterations % self.mcts_workers else 0)
+                      for i in range(self.mcts_workers)]
+        time_left = None if deadline is None else deadline - time.perf_counter()
+        seeds = [random.getrandbits(32) for _ in shares]
+        self.search_id += 1
+        futures = [executor.submit(_run_mcts_tree, game_state, player_number, share, seed, time_left, self.search_id)
+                   for share, seed in zip(shares, seeds) if share != 0]
+        merged = {}
+        for future in futures:
+            statistics, playouts, depth = future.result()
+            self.playouts += playouts
+            self.mcts_depth = max(self.mcts_depth, depth)
+            for move, (wins, visits) in sorted(statistics.items()):
+                total_wins, total_visits = merged.get(move, (0, 0))
+                merged[move] = (total_wins + wins, total_visits + visits)
+        return merged
+
+    def run_mcts_tree_parallel(self, game_state, player_number, iterations=None, deadline=None):
+        # One shared tree searched by a thread pool with virtual loss. Tree updates hold the lock and the
+        # selection and playouts are pure Python under the GIL, so the threads take turns on one core and
+        # the playouts/s stay those of one worker; use 'root' mode for a speed-up. It is kept to study how
+        # virtual loss spreads the workers of a shared tree.
+        root_node = self.mcts_root_for(game_state, player_number)
+        lock = threading.Lock()
+        counter = [0]
+        with ThreadPoolExecutor(max_workers=self.mcts_workers) as threads:
+            futures = [threads.submit(self.mcts_loop, root_node, game_state, player_number, iterations, deadline,
+                                      lock, self.virtual_loss, counter)
+                       for _ in range(self.mcts_workers)]
+            for future in futures:
+                self.playouts += future.result()
+        return root_node
 
     def choose_mcts_variant_move(self, game_state, player_number):
-
-        return random.choice(self.get_valid_moves(game_state, player_number))[0]
+        # MCTS with heuristic playouts, unless mcts_playout says otherwise
+        return self.mcts(game_state, player_number)
 
     def minimax(self, game_state, depth, player_number, maximizing_player):
+        self.check_deadline()
         if depth == 0 or game_state.is_game_over():
             return self.evaluate_state_simpler(game_state, player_number)
 
         if maximizing_player:
             max_eval = -float('inf')
             for move in self.get_valid_moves(game_state, player_number):
-                game_state_copy = game_state.copy()
-                game_state_copy.make_move(move, player_number)
-                eval = self.minimax(game_state_copy, depth - 1, player_number, False)
+                game_state.push_move(move, player_number)
+                eval = self.minimax(game_state, depth - 1, player_number, False)
+                game_state.pop_move()
                 max_eval = max(max_eval, eval)
             return max_eval
         else:
             min_eval = float('inf')
             opponent_number = 2 if player_number == 1 else 1
             for move in self.get_valid_moves(game_state, opponent_number):
-                game_state_copy = game_state.copy()
-                game_state_copy.make_move(move, opponent_number)
-                eval = self.minimax(game_state_copy, depth - 1, player_number, True)
+                game_state.push_move(move, opponent_number)
+                eval = self.minimax(game_state, depth - 1, player_number, True)
+                game_state.pop_move()
                 min_eval = min(min_eval, eval)
             return min_eval
 
     def minimax_alpha_beta(self, game_state, depth, player_number, alpha=-math.inf, beta=math.inf,
                            maximizing_player=True):
+        self.check_deadline()
         if depth == 0 or game_state.is_game_over():
             return self.evaluate_state(game_state, player_number)
 
+        table = self.transposition_table
+        alpha_original, beta_original = alpha, beta
+        key = None
+        if table is not None:
+            side_to_move = player_number if maximizing_player else 3 - player_number
+            key = search_key(game_state.hash, side_to_move, player_number)
+            entry = table.probe(key, depth)
+            if entry is not None:
+                value, flag, _ = entry
+                if flag == EXACT:
+                    table.cutoffs += 1
+                    return value
+                elif flag == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if beta <= alpha:
+                    table.cutoffs += 1
+                    return value
+
+        ply = self.root_depth - depth + 1
+        best_move = None
         if maximizing_player:
-            max_eval = -math.inf
-            for move in self.get_valid_moves(game_state, player_number):
-                game_state_copy = game_state.make_move(move, player_number)
-                eval = self.minimax_alpha_beta(game_state_copy, depth - 1, player_number, alpha, beta, False)
-                max_eval = max(max_eval, eval)
+            best_eval = -math.inf
+            moves = self.get_valid_moves(game_state, player_number)
+            if self.move_ordering:
+                moves = self.order_moves(game_state, moves, player_number, ply, key)
+            for move in moves:
+                game_state.push_move(move, player_number)
+                eval = self.minimax_alpha_beta(game_state, depth - 1, player_number, alpha, beta, False)
+                game_state.pop_move()
+                if eval > best_eval:
+                    best_eval, best_move = eval, move
                 alpha = max(alpha, eval)
                 if beta <= alpha:
+                    if self.move_ordering:
+                        self.record_cutoff(game_state, move, player_number, ply, depth)
                     break
-            return max_eval
         else:
-            min_eval = math.inf
+            best_eval = math.inf
             opponent_number = 2 if player_number == 1 else 1
-            for move in self.get_valid_moves(game_state, opponent_number):
-                game_state_copy = game_state.make_move(move, opponent_number)
-                eval = self.minimax_alpha_beta(game_state_copy, depth - 1, player_number, alpha, beta, True)
-                min_eval = min(min_eval, eval)
+            moves = self.get_valid_moves(game_state, opponent_number)
+            if self.move_ordering:
+                moves = self.order_moves(game_state, moves, opponent_number, ply, key)
+            for move in moves:
+                game_state.push_move(move, opponent_number)
+                eval = self.minimax_alpha_beta(game_state, depth - 1, player_number, alpha, beta, True)
+                game_state.pop_move()
+                if eval < best_eval:
+                    best_eval, best_move = eval, move
                 beta = min(beta, eval)
                 if beta <= alpha:
+                    if self.move_ordering:
+                        self.record_cutoff(game_state, move, opponent_number, ply, depth)
                     break
-            return min_eval
+
+        if table is not None:
+            if best_eval <= alpha_original:
+                flag = UPPER_BOUND
+            elif best_eval >= beta_original:
+                flag = LOWER_BOUND
+            else:
+                flag = EXACT
+            table.store(key, depth, best_eval, flag, best_move)
+        return best_eval
+
+    def is_capture(self, game_state, move):
+        # the resulting stack goes over 5, so redistribute_excess_pieces sidelines or captures pieces
+        (src_row, src_col), (dest_row, dest_col) = move
+        return len(game_state.board[src_row][src_col]) + len(game_state.board[dest_row][dest_col]) > 5
+
+    def order_moves(self, game_state, moves, player_number, ply, key=None):
+        table_move = None
+        if key is not None and self.transposition_table is not None:
+            table_move = self.transposition_table.best_move(key)
+        killers = self.killer_moves.get(ply, ())
+        history = self.history
+        return sorted(moves, reverse=True, key=lambda move: (
+            move == table_move,
+            self.is_capture(game_state, move),
+            move in killers,
+            history.get((player_number, move), 0)
+        ))
+
+    def record_cutoff(self, game_state, move, player_number, ply, depth):
+        history_key = (player_number, move)
+        self.history[history_key] = self.history.get(history_key, 0) + depth * depth
+        if self.is_capture(game_state, move):
+            return  # captures are searched early anyway, keep the killer slots for quiet moves
+        killers = self.killer_moves.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
 
     def get_valid_moves(self, game_state, player_number):
-        valid_moves = []
-        # Handling moves for normal gameplay
-        for row in range(game_state.board_size):
-            for col in range(game_state.board_size):
-                if self.is_playable(row, col):
-                    stack = game_state.board[row][col]
-                    if stack and stack[-1] == player_number:
-                        stack_size = len(stack)
-                        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-                        for dx, dy in directions:
-                            # Check positions based on stack size, but don't include current position in distance
-                            target_row = row + dx * stack_size
-                            target_col = col + dy * stack_size
-                            if 0 <= target_row < game_state.board_size and 0 <= target_col < game_state.board_size:
-                                if self.is_playable(target_row, target_col):
-                                    valid_moves.append(((row, col), (target_row, target_col)))
-
-        # Handling reserved pieces
-        sideline_src = (7, 7) if player_number == 1 else (7, 0)
-        if game_state.board[sideline_src[0]][sideline_src[1]]:
-            for row in range(game_state.board_size):
-                for col in range(game_state.board_size):
-                    if self.is_playable(row, col) and not (
-                            (row, col) in [(7, 7), (7, 0), (6, 7), (6, 0)]):  # Avoid placing in special cells
-                        valid_moves.append((sideline_src, (row, col)))
-
-        return valid_moves
-
-    # TODO way too simplistic, change!
+        # shared rules from movegen, through the state so PackedGameState uses its own byte scan
+        return game_state.get_legal_moves(player_number)
+
     def evaluate_state(self, game_state, player_number):
-        score = 0
-        opponent_number = 2 if player_number == 1 else 1
-
-        # Scoring for pieces on the board
-        for row in range(game_state.board_size):
-            for col in range(game_state.board_size):
-                stack = game_state.board[row][col]
-                if stack:
-                    if stack[-1] == player_number:
-                        score += 10 + 5 * len(stack)
-                    else:
-                        score -= 5 * len(stack)
-
-        # Scoring for reserved and captured pieces
-        reserved_location = (7, 7) if player_number == 1 else (7, 0)
-        captured_location = (6, 7) if player_number == 1 else (6, 0)
-        score += 20 * len(game_state.board[reserved_location[0]][reserved_location[1]])  # Value for each reserved piece
-        score += 15 * len(
-            game_state.board[captured_location[0]][captured_location[1]])  # Value for each captured opponent piece
-        score += random.uniform(-0.1, 0.1)
-        return score
+        # O(1): the evaluator weighs the features GameState/PackedGameState keep up to date in make_move
+        if self.check_features:
+            game_state.check_features()
+        return self.evaluator(game_state, player_number)
 
     def evaluate_state_simpler(self, game_state, player_number):
-        score = 0
-
-        for row in range(game_state.board_size):
-            for col in range(game_state.board_size):
-                stack = game_state.board[row][col]
-                if stack:
-                    if stack[-1] == player_number:
-                        score += 1 + 0.1 * len(stack)
+        if self.check_features:
+            game_state.check_features()
+        return game_state.stack_counts[player_number] + 0.1 * game_state.piece_counts[player_number]
 
-        return score
-
-    # todo this has to be dynamic to support multiple board sizes
     def is_playable(self, row, col):
-        non_playable_cells = [
-            (0, 0), (0, 1), (0, 6), (0, 7),
-            (1, 0), (1, 7),
-            (6, 0), (6, 7),
-            (7, 0), (7, 1), (7, 6), (7, 7)
-        ]
-        return (row, col) not in non_playable_cells
+        return movegen.is_playable(row, col)
 
     def simulate_with_heuristic(self, state, player_number):
+        # Heuristic playout on a PackedGameState, moves drawn by softmax over their evaluate_state change.
+        # The change is read from rollout.MOVE_DELTAS with the source and destination bytes instead of
+        # copying the state and evaluating it for every candidate. Returns (final state, steps).
         simulation_steps = 0
-        while not state.is_game_over() and simulation_steps < 200:  # Limiting steps for safety
+        while simulation_steps < MAX_ROLLOUT_STEPS:
             possible_moves = self.get_valid_moves(state, player_number)
             if not possible_moves:
                 break  # No more moves available
-
-            # Evaluate each move with the heuristic
-            move_scores = []
-            for move in possible_moves:
-                simulated_state = state.copy().make_move(move, player_number)
-                score = self.evaluate_state(simulated_state, player_number)
-                move_scores.append((score, move))
-
-            # Normalize scores to probabilities
-            max_score = max(move_scores, key=lambda x: x[0])[0]
-            probabilities = [math.exp(score - max_score) for score, _ in move_scores]
-            total = sum(probabilities)
-            probabilities = [p / total for p in probabilities]
-
-            # Select move based on biased probability
-            move = random.choices([move for _, move in move_scores], weights=probabilities, k=1)[0]
+            move = heuristic_move(state.cells, possible_moves, player_number, self.playout_temperature)
             state = state.make_move(move, player_number)
-
             simulation_steps += 1
             player_number = 3 - player_number  # Switch player
+        return state, simulation_steps
+
+
 
+_worker_ai = None
+_worker_reported = {}  # root statistics this pool process already sent for the current MCTS search
+
+
+def _init_search_worker(config):
+    global _worker_ai
+    _worker_ai = AI(**config)
+
+
+def _search_root_move(game_state, move, depth, player_number, use_alpha_beta, alpha, time_left, search_id):
+    # runs in a pool process on its own unpickled copy of the root state, returns (eval or None on timeout, nodes)
+    ai = _worker_ai
+    if ai.search_id != search_id:
+        ai.search_id = search_id
+        ai.killer_moves = {}
+        ai.history = {}
+        if ai.transposition_table is not None:
+            ai.transposition_table.new_search()
+    ai.nodes = 0
+    ai.root_depth = depth
+    ai.deadline = None if time_left is None else time.perf_counter() + time_left
+    game_state.push_move(move, player_number)
+    try:
+        if use_alpha_beta:
+            eval = ai.minimax_alpha_beta(game_state, depth, player_number, alpha, math.inf, True)
+        else:
+            eval = ai.minimax(game_state, depth, player_number, True)
+    except SearchTimeout:
+        eval = None
+    finally:
+        ai.deadline = None
+    return eval, ai.nodes
+
+
+def _run_mcts_tree(game_state, player_number, iterations, seed, time_left, search_id):
+    # One independent tree of root-parallel MCTS, returns (root statistics, playouts, depth). Each pool process
+    # keeps its own tree between turns, like the serial search does. A process given two shares of the same
+    # search grows the tree of its first share, so the second one only sends the statistics it added.
+    global _worker_reported
+    random.seed(seed)
+    ai = _worker_ai
+    if ai.search_id != search_id:
+        ai.search_id = search_id
+        _worker_reported = {}
+    ai.playouts = 0
+    ai.mcts_depth = 0
+    deadline = None if time_left is None else time.perf_counter() + time_left
+    root_node = ai.run_mcts(game_state, player_number, iterations, deadline)
+    statistics = ai.root_statistics(root_node)
+    added = {}
+    for move, (wins, visits) in statistics.items():
+        reported_wins, reported_visits = _worker_reported.get(move, (0.0, 0))
+        if visits > reported_visits:
+            added[move] = (wins - reported_wins, visits - reported_visits)
+    _worker_reported = statistics
+    return added, ai.playouts, ai.mcts_depth
 
 
 """
@@ -0,0 +1,72 @@
+"""
+AI searches on a background thread, so the pygame loop keeps drawing and handling events while an
+AI thinks.
+
+AISearch runs AI.choose_move on its own copy of the position and posts the result to the pygame
+event queue as an AI_MOVE_EVENT, which GUI.main_loop hands to GameController.handle_ai_move. A
+search is cancelled by cancel(): the AI stops at its next node or playout (AI.stop) and the event of
+a cancelled search is never acted on, so a reset never sees a move from the game it threw away.
+
+A 'ponder' search runs AI.ponder instead, on the opponent's time, and posts nothing: it only fills the
+AI's tables until it is cancelled and joined, which the controller does before the same AI searches
+its real move.
+
+A thread and not a process, so the AI object keeps its transposition table and MCTS tree between
+turns; the search holds the GIL, but the interpreter switches to the pygame loop every few
+milliseconds, which is enough to keep the window responsive.
+"""
+import threading
+import time
+
+import pygame
+
+from ai import SearchTimeout
+from search_log import get_logger
+
+AI_MOVE_EVENT = pygame.USEREVENT + 1
+
+log = get_logger('worker')
+
+
+class AISearch:
+    def __init__(self, ai, game_state, player_number, purpose='move'):
+        self.ai = ai
+        self.game_state = game_state.copy()  # the controller keeps playing on its own state
+        self.player_number = player_number
+        self.purpose = purpose  # 'move' for an AI turn, 'suggestion' for the S key, 'ponder' on the opponent's time
+        self.cancelled = False
+        self.move = None
+        self.move_time = 0.0
+        self.thread = threading.Thread(target=self.run, name=f'ai-{purpose}-{player_number}', daemon=True)
+
+    def start(self):
+        # called from the pygame thread, like cancel(), so the AI's stop flag is never cleared after a cancel
+        self.ai.stopped = False
+        self.thread.start()
+        return self
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            if self.purpose == 'ponder':
+                self.ai.ponder(self.game_state, self.player_number)
+                return
+            self.move = self.ai.choose_move(self.game_state, self.player_number)
+        except SearchTimeout:
+            self.move = None  # stopped before any depth finished
+        except Exception:
+            log.exception("AI search for player %d failed", self.player_number)
+            self.move = None
+        self.move_time = time.perf_counter() - start
+        if not self.cancelled:
+            pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, search=self))
+
+    def cancel(self, wait=False):
+        # wait: until the thread has ended, before the AI is given another search
+        self.cancelled = True
+        self.ai.stop()
+        if wait:
+            self.thread.join()
+
+    def is_running(self):
+        return self.thread.is_alive()
@@ -0,0 +1,520 @@
+import argparse
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import movegen
+from ai import AI
+from game_state import GameState
+from mcts import MCTSNode
+from notation import position_to_text
+from packed_state import PackedGameState
+from perft import perft, load_suite_positions, SUITE_POSITIONS
+from rollout import BatchRollouts, MAX_ROLLOUT_STEPS
+from search_log import configure
+
+SUITE_RESULTS = 'benchmark_results.jsonl'
+SPEED_TOLERANCE = 0.15  # a rate more than 15% below the previous run is reported as a regression
+
+
+def count_nodes(game_state, depth, player_number):
+    # Copy/make-move walk of the whole tree, the same work every search node pays for
+    if depth == 0:
+        return 1
+    nodes = 1
+    for move in game_state.get_legal_moves(player_number):
+        child = game_state.copy()
+        child.make_move(move, player_number)
+        nodes += count_nodes(child, depth - 1, 3 - player_number)
+    return nodes
+
+
+def benchmark_board(depth=2, repeat=3):
+    engines = [('GameState (deepcopy)', GameState()), ('PackedGameState (bytes)', PackedGameState())]
+    results = {}
+    for name, state in engines:
+        best = None
+        nodes = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            nodes = count_nodes(state, depth, 1)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = nodes / best
+        print(f"{name:<26} depth {depth}: {nodes} nodes in {best:.3f}s -> {nodes / best:,.0f} nodes/s")
+    baseline, packed = results.values()
+    print(f"Speedup: {packed / baseline:.1f}x")
+    return results
+
+
+def play_random_opening(plies, seed=0):
+    rng = random.Random(seed)
+    state = GameState()
+    player_number = 1
+    mover = AI()
+    for _ in range(plies):
+        moves = mover.get_valid_moves(state, player_number)
+        if not moves:
+            break
+        state.make_move(rng.choice(moves), player_number)
+        player_number = 3 - player_number
+    return state, player_number
+
+
+def benchmark_transposition_table(difficulty='Hard', sizes=(1 << 10, 1 << 14, 1 << 18), moves=4):
+    # the same short AlphaBeta game for every table size, so hit rates can be compared
+    for size in [0] + list(sizes):
+        ai = AI('AlphaBeta', difficulty, use_transposition_table=size > 0, tt_size=max(size, 1))
+        state, player_number = play_random_opening(8)
+        start = time.perf_counter()
+        for _ in range(moves):
+            move = ai.choose_move(state, player_number)
+            if move is None:
+                break
+            state.make_move(move, player_number)
+            player_number = 3 - player_number
+        elapsed = time.perf_counter() - start
+        label = f"{size} entries" if size else "no table"
+        report = ai.transposition_table.report() if ai.transposition_table else ""
+        print(f"{label:<16} {elapsed:.2f}s  {report}")
+
+
+def benchmark_move_ordering(difficulty='Medium', positions=4, use_transposition_table=False):
+    # AlphaBeta nodes with and without move ordering, from the same positions
+    totals = {False: [0, 0.0], True: [0, 0.0]}
+    for seed in range(positions):
+        state, player_number = play_random_opening(10, seed)
+        line = f"position {seed}:"
+        for ordering in (False, True):
+            ai = AI('AlphaBeta', difficulty, use_transposition_table=use_transposition_table, move_ordering=ordering)
+            start = time.perf_counter()
+            ai.choose_minimax_move(state, player_number, use_alpha_beta=True)
+            elapsed = time.perf_counter() - start
+            totals[ordering][0] += ai.nodes
+            totals[ordering][1] += elapsed
+            line += f"  {'ordered' if ordering else 'scan order'} {ai.nodes} nodes {elapsed:.2f}s"
+        print(line)
+    plain, ordered = totals[False], totals[True]
+    print(f"total: scan order {plain[0]} nodes {plain[1]:.2f}s, ordered {ordered[0]} nodes {ordered[1]:.2f}s "
+          f"({plain[0] / max(ordered[0], 1):.1f}x fewer nodes)")
+    return totals
+
+
+def benchmark_move_generation(positions=200, repeat=20):
+    # precomputed movegen tables against the plain board scan they replaced
+    samples = [play_random_opening(plies, seed) for seed in range(positions) for plies in (0, 15, 40)]
+    for name, generate in (('reference scan', movegen.reference_moves), ('movegen tables', movegen.generate_moves)):
+        start = time.perf_counter()
+        count = 0
+        for _ in range(repeat):
+            for state, player_number in samples:
+                count += 1
+                generate(state.board, player_number)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<16} {count / elapsed:,.0f} move lists/s")
+
+
+def benchmark_parallel_root(strategy='MiniMax', difficulty='Medium', workers=4, positions=3):
+    # serial against process-pool root splitting; MiniMax evaluation has no noise, so both must pick the same move
+    serial = AI(strategy, difficulty)
+    parallel = AI(strategy, difficulty, workers=workers)
+    try:
+        for seed in range(positions):
+            state, player_number = play_random_opening(10, seed)
+            timings = []
+            for ai in (serial, parallel):
+                start = time.perf_counter()
+                move = ai.choose_move(state, player_number)
+                timings.append((move, time.perf_counter() - start))
+            (serial_move, serial_time), (parallel_move, parallel_time) = timings
+            print(f"position {seed}: serial {serial_move} {serial_time:.2f}s, {workers} workers {parallel_move} "
+                  f"{parallel_time:.2f}s ({serial_time / parallel_time:.1f}x), same move: {serial_move == parallel_move}")
+    finally:
+        parallel.close()
+
+
+def benchmark_parallel_mcts(workers=(1, 2, 4), iterations=200, modes=('root', 'tree')):
+    # playouts per second of the MCTS strategy for each worker count and parallel mode; 'tree' mode runs
+    # threads under the GIL and is expected to stay at 1x, see AI.run_mcts_tree_parallel
+    state, player_number = play_random_opening(10)
+    for mode in modes:
+        baseline = None
+        for count in workers:
+            ai = AI('MCTS', mcts_iterations=iterations, mcts_workers=count, mcts_mode=mode)
+            try:
+                if count > 1 and mode == 'root':
+                    ai.get_executor().submit(int).result()  # start the pool outside the timing
+                start = time.perf_counter()
+                ai.choose_move(state, player_number)
+                elapsed = time.perf_counter() - start
+            finally:
+                ai.close()
+            rate = ai.playouts / elapsed
+            baseline = baseline or rate
+            print(f"{mode:<5} {count:>2} workers: {rate:,.0f} playouts/s ({rate / baseline:.1f}x)")
+
+
+def benchmark_tree_memory(iterations=2000):
+    # bytes held by the MCTS tree per node after a search
+    state, player_number = play_random_opening(10)
+    ai = AI('MCTS', mcts_iterations=iterations)
+    tracemalloc.start()
+    ai.choose_move(state, player_number)
+    ai.mcts_root_state = None
+    tree_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nodes = 0
+    stack = [ai.mcts_root]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        stack.extend(node.children)
+    print(f"{iterations} iterations: {nodes} nodes, {tree_bytes / 1024:.0f} KiB, {tree_bytes / nodes:.0f} bytes/node")
+
+
+def benchmark_rollouts(batch_sizes=(8, 32, 128, 256), playouts=256, policies=('random', 'heuristic')):
+    # playouts per second of each playout policy, one move at a time on PackedGameState vs NumPy batches,
+    # all relative to serial random playouts
+    state, player_number = play_random_opening(10)
+    packed = PackedGameState.from_game_state(state)
+    ai = AI('MCTS')
+    baseline = None
+    for policy in policies:
+        start = time.perf_counter()
+        for _ in range(playouts // 8):
+            game = packed.copy()
+            if policy == 'heuristic':
+                ai.simulate_with_heuristic(game, player_number)
+                continue
+            current_player = player_number
+            for _ in range(MAX_ROLLOUT_STEPS):
+                moves = ai.get_valid_moves(game, current_player)
+                if not moves:
+                    break
+                game.make_move(random.choice(moves), current_player)
+                current_player = 3 - current_player
+        rate = playouts // 8 / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(f"{policy:<9} serial      : {rate:,.0f} playouts/s ({rate / baseline:.1f}x)")
+        batch = BatchRollouts(seed=1, policy=policy)
+        for size in batch_sizes:
+            start = time.perf_counter()
+            for _ in range(max(1, playouts // size)):
+                batch.run(packed, player_number, player_number, size)
+            rate = max(1, playouts // size) * size / (time.perf_counter() - start)
+            print(f"{policy:<9} batch of {size:>3}: {rate:,.0f} playouts/s ({rate / baseline:.1f}x)")
+
+
+def evaluate_by_scan(game_state, player_number):
+    # AI.evaluate_state before the incremental features, a scan of all 64 cells, kept as the baseline
+    score = 0
+    for row in game_state.board:
+        for stack in row:
+            if stack:
+                score += 10 + 5 * len(stack) if stack[-1] == player_number else -5 * len(stack)
+    reserved_row, reserved_col = movegen.RESERVE_CELLS[player_number]
+    captured_row, captured_col = movegen.CAPTURED_CELLS[player_number]
+    score += 20 * len(game_state.board[reserved_row][reserved_col])
+    score += 15 * len(game_state.board[captured_row][captured_col])
+    return score + random.uniform(-0.1, 0.1)
+
+
+def benchmark_evaluation(positions=20, repeat=2000):
+    # evaluate_state calls per second, 64-cell scan vs incremental features, and AlphaBeta nodes/s with each
+    # (MiniMax scores its leaves with evaluate_state_simpler); no transposition table, so the second search
+    # does not start from the first one's entries
+    ai = AI('AlphaBeta', difficulty='Medium', use_transposition_table=False, opening_book=False,
+            endgame_solver=False)
+    states = [play_random_opening(plies, seed)[0] for seed, plies in enumerate(range(0, 4 * positions, 4))]
+    evaluators = (('scan', evaluate_by_scan), ('features', ai.evaluate_state))
+    for name, evaluate in evaluators:
+        start = time.perf_counter()
+        for _ in range(repeat // len(states) + 1):
+            for state in states:
+                evaluate(state, 1)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<9}: {(repeat // len(states) + 1) * len(states) / elapsed:,.0f} evaluations/s")
+    for name, evaluate in evaluators:
+        ai.evaluate_state = evaluate  # the search calls it through the instance
+        start = time.perf_counter()
+        nodes = 0
+        for state in states[:3]:
+            ai.choose_move(state, 1)
+            nodes += ai.nodes
+        print(f"{name:<9}: AlphaBeta depth {ai.max_depth}, {nodes / (time.perf_counter() - start):,.0f} nodes/s")
+
+
+def select_child_by_sorting(node):
+    # the selection MCTSNode used before the NumPy arrays, kept here as the baseline
+    return sorted(node.children, key=lambda c: float('inf') if c.visits == 0 else c.wins / c.visits + math.sqrt(
+        2 * math.log(node.visits) / c.visits))[-1]
+
+
+def benchmark_selection(widths=(20, 100, 300, 600), repeat=2000):
+    # UCT selection cost on wide nodes with random statistics
+    rng = random.Random(0)
+    for width in widths:
+        node = MCTSNode(player_number=1)
+        node.move_count = width
+        node.visits = width * 10
+        node.children = []
+        node.child_stats = np.array([[rng.uniform(-5, 5) for _ in range(width)],
+                                     [float(rng.randint(1, 20)) for _ in range(width)]])
+        for index in range(width):
+            node.children.append(MCTSNode(move=index, parent=node, player_number=2, index=index))
+        timings = []
+        for select in (select_child_by_sorting, lambda n: n.select_child(),
+                       lambda n: n.select_child(policy='puct')):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                select(node)
+            timings.append((time.perf_counter() - start) / repeat * 1e6)
+        print(f"{width:>4} children: sorted {timings[0]:.1f}us, UCB1 vector {timings[1]:.1f}us "
+              f"({timings[0] / timings[1]:.1f}x), PUCT vector {timings[2]:.1f}us")
+
+
+def generate_suite_positions(path=SUITE_POSITIONS, seeds=500):
+    # Picks the suite positions from seeded random games: the start, an early opening and a midgame, the first
+    # positions with four stacks of height 4 or more, and reserve-drop endgames where the player to move has a
+    # reserve, at most three stacks and still a stack move.
+    heavy = lambda state, player_number: sum(state.height(row, col) >= 4 for row, col in movegen.PLAYABLE_CELLS) >= 4
+    endgame = lambda state, player_number: state.height(*movegen.RESERVE_CELLS[player_number]) > 0 and \
+        state.stack_counts[player_number] <= 3
+    wanted = [('start', 'opening', lambda state, player_number, plies: plies == 0),
+              ('opening', 'opening', lambda state, player_number, plies: plies == 6),
+              ('midgame', 'midgame', lambda state, player_number, plies: plies == 30),
+              ('heavy-stacks', 'heavy-stack', lambda state, player_number, plies: heavy(state, player_number)),
+              ('reserve-endgame', 'endgame', lambda state, player_number, plies: endgame(state, player_number)),
+              ('reserve-endgame-2', 'endgame', lambda state, player_number, plies: endgame(state, player_number))]
+    positions = []
+    for seed in range(seeds):
+        if not wanted:
+            break
+        rng = random.Random(seed)
+        state = PackedGameState()
+        player_number = 1
+        for plies in range(MAX_ROLLOUT_STEPS):
+            if not state.has_valid_moves(player_number):
+                break
+            name, category, accept = wanted[0]
+            if accept(state, player_number, plies):
+                positions.append({'name': name, 'category': category, 'seed': seed, 'plies': plies,
+                                  'position': position_to_text(state, player_number)})
+                wanted.pop(0)
+                break  # one position per game, so the two endgames come from different games
+            move = rng.choice(state.get_legal_moves(player_number))
+            state.make_move(move, player_number)
+            player_number = 3 - player_number
+    with open(path, 'w') as file:
+        file.write('[\n' + ',\n'.join(json.dumps(position) for position in positions) + '\n]\n')
+    print(f"{len(positions)} positions written to {path}" +
+          (f", not found: {', '.join(name for name, _, _ in wanted)}" if wanted else ''))
+
+
+def repeat_timed(run, min_time=0.3, min_calls=3):
+    # (result of run(), fastest call in seconds), calling it at least min_calls times and for min_time, so a
+    # busy moment of the machine does not show up as a regression
+    calls = 0
+    best = math.inf
+    start = time.perf_counter()
+    while calls < min_calls or time.perf_counter() - start < min_time:
+        call_start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - call_start)
+        calls += 1
+    return result, best
+
+
+def measure_position(state, player_number, perft_depth=3, search_depths=(0, 1, 2), mcts_iterations=200):
+    # Counts and rates of one position, flat so runs can be compared key by key: keys ending in '/s' are
+    # rates, every other value is a count that only changes when the rules or the search change.
+    metrics = {}
+    for depth in range(1, perft_depth + 1):
+        metrics[f'perft {depth}'], seconds = repeat_timed(lambda: perft(state.copy(), depth, player_number))
+    # the last ply is counted from the move list without being played, so this is leaves, not nodes, per second
+    metrics['perft leaves/s'] = round(metrics[f'perft {perft_depth}'] / seconds)
+
+    def search(strategy, depth):
+        # no evaluation noise, so the node counts are the same on every run, and no opening book
+        ai = AI(strategy, evaluation_noise=0, opening_book=False, endgame_solver=False)
+        ai.max_depth = depth
+        ai.choose_move(state.copy(), player_number)
+        return ai.nodes
+
+    for strategy in ('MiniMax', 'AlphaBeta'):
+        for depth in search_depths:
+            nodes, seconds = repeat_timed(lambda: search(strategy, depth))
+            metrics[f'{strategy} depth {depth} nodes'] = nodes
+            metrics[f'{strategy} depth {depth} nodes/s'] = round(nodes / seconds)
+    random.seed(0)
+    ai = AI('MCTS', mcts_iterations=mcts_iterations, opening_book=False, endgame_solver=False)
+    ai.choose_move(state.copy(), player_number)
+    metrics['MCTS playouts/s'] = round(ai.playouts / max(ai.search_time, 1e-9))
+    return metrics
+
+
+def compare_runs(previous, current, tolerance=SPEED_TOLERANCE):
+    # changed counts and rates that dropped by more than `tolerance` against the previous stored run
+    problems = []
+    for name, metrics in current['positions'].items():
+        before = previous['positions'].get(name, {})
+        for key, value in metrics.items():
+            if key not in before:
+                continue
+            if key.endswith('/s'):
+                if value < before[key] * (1 - tolerance):
+                    problems.append(f"{name}: {key} {before[key]:,} -> {value:,} ({value / before[key] - 1:+.0%})")
+            elif value != before[key]:
+                problems.append(f"{name}: {key} changed {before[key]:,} -> {value:,}")
+    return problems
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_suite(positions_path=SUITE_POSITIONS, results_path=SUITE_RESULTS, perft_depth=3, search_depths=(0, 1, 2),
+                    mcts_iterations=200, save=False, tolerance=SPEED_TOLERANCE):
+    # Every suite position: perft counts, MiniMax/AlphaBeta nodes and nodes/s per depth and MCTS playouts/s.
+    # The run is compared with the last one stored in results_path, and appended to it with save=True.
+    # Returns the list of regressions.
+    run = {'commit': git_commit(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+           'machine': f"{platform.machine()} {platform.python_implementation()} {platform.python_version()}",
+           'settings': {'perft_depth': perft_depth, 'search_depths': list(search_depths),
+                        'mcts_iterations': mcts_iterations},
+           'positions': {}}
+    for name, category, state, player_number in load_suite_positions(positions_path):
+        metrics = measure_position(state, player_number, perft_depth, search_depths, mcts_iterations)
+        run['positions'][name] = metrics
+        perft_counts = ' '.join(str(metrics[f'perft {depth}']) for depth in range(1, perft_depth + 1))
+        print(f"{name} ({category}, player {player_number} to move)")
+        print(f"  perft 1-{perft_depth}: {perft_counts}, {metrics['perft leaves/s']:,} leaves/s")
+        for strategy in ('MiniMax', 'AlphaBeta'):
+            print(f"  {strategy:<9} " + ', '.join(
+                f"depth {depth} {metrics[f'{strategy} depth {depth} nodes']} nodes "
+                f"{metrics[f'{strategy} depth {depth} nodes/s']:,}/s" for depth in search_depths))
+        print(f"  MCTS      {metrics['MCTS playouts/s']:,} playouts/s")
+
+    previous = None
+    try:
+        with open(results_path) as file:
+            lines = [line for line in file if line.strip()]
+        previous = json.loads(lines[-1]) if lines else None
+    except FileNotFoundError:
+        pass
+    problems = []
+    if previous:
+        problems = compare_runs(previous, run, tolerance)
+        note = '' if previous.get('machine') == run['machine'] else f" (measured on {previous.get('machine')})"
+        print(f"compared with {previous.get('commit')} of {previous.get('date')}{note}: "
+              f"{len(problems) or 'no'} regression{'s' if len(problems) != 1 else ''}")
+        for problem in problems:
+            print(f"  {problem}")
+    if save:
+        with open(results_path, 'a') as file:
+            file.write(json.dumps(run) + '\n')
+        print(f"results appended to {results_path}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Engine benchmarks')
+    parser.add_argument('--log-level', help="log the searches, e.g. INFO for one line per move or TRACE")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    board_parser = subparsers.add_parser('board', help='nodes per second of GameState vs PackedGameState')
+    board_parser.add_argument('--depth', type=int, default=2)
+    board_parser.add_argument('--repeat', type=int, default=3)
+
+    tt_parser = subparsers.add_parser('tt', help='AlphaBeta time and transposition table hit rate per table size')
+    tt_parser.add_argument('--difficulty', default='Hard', choices=['Easy', 'Medium', 'Hard'])
+    tt_parser.add_argument('--sizes', type=int, nargs='+', default=[1 << 10, 1 << 14, 1 << 18])
+    tt_parser.add_argument('--moves', type=int, default=4)
+
+    ordering_parser = subparsers.add_parser('ordering', help='AlphaBeta node counts with and without move ordering')
+    ordering_parser.add_argument('--difficulty', default='Medium', choices=['Easy', 'Medium', 'Hard'])
+    ordering_parser.add_argument('--positions', type=int, default=4)
+    ordering_parser.add_argument('--tt', action='store_true', help='also use the transposition table')
+
+    subparsers.add_parser('movegen', help='move lists per second, movegen tables vs the reference scan')
+
+    parallel_parser = subparsers.add_parser('parallel', help='serial vs process-pool root search')
+    parallel_parser.add_argument('--strategy', default='MiniMax', choices=['MiniMax', 'AlphaBeta'])
+    parallel_parser.add_argument('--difficulty', default='Medium', choices=['Easy', 'Medium', 'Hard'])
+    parallel_parser.add_argument('--workers', type=int, default=4)
+    parallel_parser.add_argument('--positions', type=int, default=3)
+
+    mcts_parser = subparsers.add_parser('mcts', help='MCTS playouts/s scaling with the number of workers')
+    mcts_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    mcts_parser.add_argument('--iterations', type=int, default=200)
+    mcts_parser.add_argument('--modes', nargs='+', default=['root', 'tree'], choices=['root', 'tree'])
+
+    memory_parser = subparsers.add_parser('tree-memory', help='memory held by the MCTS tree per node')
+    memory_parser.add_argument('--iterations', type=int, default=2000)
+
+    eval_parser = subparsers.add_parser('eval', help='evaluate_state speed, board scan vs incremental features')
+    eval_parser.add_argument('--positions', type=int, default=20)
+
+    rollout_parser = subparsers.add_parser('rollouts', help='playouts/s per policy, serial vs NumPy batches')
+    rollout_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[8, 32, 128, 256])
+    rollout_parser.add_argument('--playouts', type=int, default=256)
+    rollout_parser.add_argument('--policies', nargs='+', default=['random', 'heuristic'], choices=['random', 'heuristic'])
+
+    select_parser = subparsers.add_parser('select', help='MCTS child selection cost on wide nodes')
+    select_parser.add_argument('--widths', type=int, nargs='+', default=[20, 100, 300, 600])
+
+    suite_parser = subparsers.add_parser('suite', help='saved positions: perft counts, search nodes/s, MCTS playouts/s, '
+                                                       'compared with the last stored run')
+    suite_parser.add_argument('--positions', default=SUITE_POSITIONS)
+    suite_parser.add_argument('--results', default=SUITE_RESULTS)
+    suite_parser.add_argument('--perft-depth', type=int, default=3)
+    suite_parser.add_argument('--depths', type=int, nargs='+', default=[0, 1, 2], help='MiniMax/AlphaBeta depths')
+    suite_parser.add_argument('--mcts-iterations', type=int, default=200)
+    suite_parser.add_argument('--tolerance', type=float, default=SPEED_TOLERANCE, help='allowed relative slowdown')
+    suite_parser.add_argument('--save', action='store_true', help='append this run to the results file')
+    suite_parser.add_argument('--generate', action='store_true', help='pick the positions again from seeded games')
+
+    args = parser.parse_args()
+    if args.log_level:
+        configure(args.log_level)
+    if args.command == 'board':
+        benchmark_board(args.depth, args.repeat)
+    elif args.command == 'tt':
+        benchmark_transposition_table(args.difficulty, args.sizes, args.moves)
+    elif args.command == 'movegen':
+        benchmark_move_generation()
+    elif args.command == 'parallel':
+        benchmark_parallel_root(args.strategy, args.difficulty, args.workers, args.positions)
+    elif args.command == 'mcts':
+        benchmark_parallel_mcts(args.workers, args.iterations, args.modes)
+    elif args.command == 'tree-memory':
+        benchmark_tree_memory(args.iterations)
+    elif args.command == 'eval':
+        benchmark_evaluation(args.positions)
+    elif args.command == 'rollouts':
+        benchmark_rollouts(args.batch_sizes, args.playouts, args.policies)
+    elif args.command == 'select':
+        benchmark_selection(args.widths)
+    elif args.command == 'ordering':
+        benchmark_move_ordering(args.difficulty, args.positions, args.tt)
+    elif args.command == 'suite':
+        if args.generate:
+            generate_suite_positions(args.positions)
+        elif benchmark_suite(args.positions, args.results, args.perft_depth, args.depths, args.mcts_iterations,
+                             args.save, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
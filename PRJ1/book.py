@@ -0,0 +1,83 @@
+"""
+Opening book: the best moves of the first plies of the game, searched offline by build_book.py, so
+the AI plays them without searching.
+
+The book file is BOOK_MAGIC followed by ENTRY records sorted by key: the Zobrist hash of the position
+with the player to move (book_key), the move as source and destination cell indices and its search
+score for the player to move. A position has one record per book move, best first. The file is only
+memory mapped on the first probe and looked up with a binary search, so an AI that never leaves the
+book's positions reads a few pages of it, and one that is past the opening pays nothing.
+"""
+import os
+
+import numpy as np
+
+import movegen
+from zobrist import SIDE_KEYS
+
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+BOOK_DEPTH = 3  # build_book.py --depth and --strategy of the shipped book
+BOOK_STRATEGY = 'AlphaBeta'
+BOOK_MAGIC = b'IABOOK\x00\x01'
+ENTRY = np.dtype([('key', '<u8'), ('source', 'u1'), ('target', 'u1'), ('score', '<f4')])
+
+
+def book_key(game_state, player_number):
+    return game_state.hash ^ SIDE_KEYS[player_number]
+
+
+def write_book(path, positions):
+    # positions: {book_key: [(score, move), ...]}, the moves of a position are written best first
+    records = []
+    for key, moves in positions.items():
+        for score, ((src_row, src_col), (dest_row, dest_col)) in sorted(moves, key=lambda item: -item[0]):
+            records.append((key, src_row * movegen.BOARD_SIZE + src_col, dest_row * movegen.BOARD_SIZE + dest_col,
+                            score))
+    entries = np.array(records, dtype=ENTRY)
+    entries = entries[np.argsort(entries['key'], kind='stable')]
+    with open(path, 'wb') as file:
+        file.write(BOOK_MAGIC)
+        file.write(entries.tobytes())
+    return len(entries)
+
+
+class OpeningBook:
+    def __init__(self, path=BOOK_FILE):
+        self.path = path
+        self.entries = None  # memory mapped by load() on the first probe
+        self.hits = 0
+
+    def load(self):
+        if self.entries is None:
+            self.entries = np.empty(0, dtype=ENTRY)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > len(BOOK_MAGIC):
+                with open(self.path, 'rb') as file:
+                    if file.read(len(BOOK_MAGIC)) != BOOK_MAGIC:
+                        raise ValueError(f"{self.path} is not an opening book")
+                self.entries = np.memmap(self.path, dtype=ENTRY, mode='r', offset=len(BOOK_MAGIC))
+        return self.entries
+
+    def __len__(self):
+        return len(self.load())
+
+    def probe(self, game_state, player_number):
+        # [(move, score)] of the position, best first, empty when it is not in the book; moves that are not
+        # legal there (a hash collision) are left out
+        entries = self.load()
+        if not len(entries):
+            return []
+        key = np.uint64(book_key(game_state, player_number))
+        keys = entries['key']
+        start = np.searchsorted(keys, key, side='left')
+        end = np.searchsorted(keys, key, side='right')
+        if start == end:
+            return []
+        legal = set(game_state.get_legal_moves(player_number))
+        moves = []
+        for entry in entries[start:end]:
+            move = (divmod(int(entry['source']), movegen.BOARD_SIZE), divmod(int(entry['target']), movegen.BOARD_SIZE))
+            if move in legal:
+                moves.append((move, float(entry['score'])))
+        if moves:
+            self.hits += 1
+        return moves
@@ -0,0 +1,74 @@
+"""
+Builds the opening book (book.py) offline.
+
+Starting from the start position, every book position gets a full-width AlphaBeta search of all its
+moves (AI.score_root_moves, without evaluation noise), the best --width moves are stored, and the
+positions they lead to are searched at the next ply, up to --plies. Transpositions are searched once.
+The searches of a ply run in a process pool, so a book far deeper than the AI could search during a
+game is built once and then played instantly.
+
+python3 build_book.py --plies 6 --width 3 --depth 3 --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ai import AI
+from book import BOOK_FILE, BOOK_DEPTH, BOOK_STRATEGY, book_key, write_book, OpeningBook
+from packed_state import PackedGameState
+
+
+def score_position(game_state, player_number, depth, strategy):
+    # runs in a pool process; [(score, move)] of every move of the position, best first
+    ai = AI(strategy, evaluation_noise=0, opening_book=False)
+    return ai.score_root_moves(game_state, player_number, depth, use_alpha_beta=strategy == 'AlphaBeta')
+
+
+def build_book(pool, plies, width, depth, strategy=BOOK_STRATEGY):
+    # {book_key: [(score, move)]} of the positions reached by playing book moves from the start position
+    positions = {}
+    frontier = {book_key(PackedGameState(), 1): (PackedGameState(), 1)}
+    for ply in range(plies):
+        start = time.perf_counter()
+        futures = {key: pool.submit(score_position, state, player_number, depth, strategy)
+                   for key, (state, player_number) in frontier.items()}
+        next_frontier = {}
+        for key, future in futures.items():
+            best = future.result()[:width]
+            positions[key] = best
+            state, player_number = frontier[key]
+            for _, move in best:
+                child = state.copy()
+                child.make_move(move, player_number)
+                if child.has_valid_moves(3 - player_number):
+                    child_key = book_key(child, 3 - player_number)
+                    if child_key not in positions:
+                        next_frontier[child_key] = (child, 3 - player_number)
+        print(f"ply {ply + 1}: {len(frontier)} positions searched in {time.perf_counter() - start:.1f}s")
+        frontier = next_frontier
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the opening book from offline searches')
+    parser.add_argument('--plies', type=int, default=6, help='book depth from the start position')
+    parser.add_argument('--width', type=int, default=3, help='moves kept (and followed) per position')
+    parser.add_argument('--depth', type=int, default=BOOK_DEPTH, help='search depth per move, as AI.max_depth')
+    parser.add_argument('--strategy', default=BOOK_STRATEGY, choices=['MiniMax', 'AlphaBeta'])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--output', default=BOOK_FILE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        positions = build_book(pool, args.plies, args.width, args.depth, args.strategy)
+    entries = write_book(args.output, positions)
+    print(f"{len(positions)} positions, {entries} moves, {os.path.getsize(args.output) / 1024:.0f} KiB "
+          f"written to {args.output} in {time.perf_counter() - start:.0f}s")
+    book = OpeningBook(args.output)
+    print(f"start position: {book.probe(PackedGameState(), 1)}")
+
+
+if __name__ == "__main__":
+    main()
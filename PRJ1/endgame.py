@@ -0,0 +1,138 @@
+"""
+Exact endgame solver for the late positions with few stacks left, where reserve drops make the
+evaluation searches wide and slow.
+
+A player who cannot move a stack on their turn has lost, so a position is a WIN for the player to
+move when one of their moves leaves the opponent in a LOSS, and a LOSS when every move leaves the
+opponent in a WIN. EndgameSolver proves this by a depth-first search, deepened two plies at a time
+until a result is proven or the node budget runs out. Proven results hold at any depth, so they are
+memoized by the Zobrist key of the position and the player to move and kept between solves: the
+moves of a won endgame are read back from the table without searching again.
+
+python3 endgame.py                                          # the suite positions of bench_positions.json
+python3 endgame.py --position "8/8/2(oooxo)5/1x6/6(xxoox)1/2(ooxox)5/(xxxxx)4(xoxxx)1(ooooo)/o7 2" --nodes 100000
+"""
+import argparse
+import time
+
+import movegen
+from notation import position_from_text, move_to_text
+from perft import load_suite_positions, SUITE_POSITIONS
+from zobrist import SIDE_KEYS
+
+WIN, LOSS, UNKNOWN = 1, -1, 0
+ENDGAME_STACKS = 8  # stacks of both players (reserve and captured cells included) for solve() to try
+ENDGAME_PLIES = 7  # deepest proof searched
+ENDGAME_NODES = 2000  # nodes per solve, about 100 ms when a wide reserve-drop endgame uses them all
+MAX_PROVEN = 1 << 18  # proven positions kept before the table is cleared
+
+
+class SolverBudget(Exception):
+    pass
+
+
+class EndgameSolver:
+    def __init__(self, max_stacks=ENDGAME_STACKS, max_plies=ENDGAME_PLIES, node_budget=ENDGAME_NODES):
+        self.max_stacks = max_stacks
+        self.max_plies = max_plies
+        self.node_budget = node_budget
+        self.proven = {}  # key -> (WIN or LOSS for the player to move, winning move or None)
+        self.searched = {}  # key -> deepest search without a proof, for the current solve only
+        self.nodes = 0  # nodes visited by the last solve
+        self.budget = 0
+
+    def applies(self, game_state):
+        return game_state.stack_counts[1] + game_state.stack_counts[2] <= self.max_stacks
+
+    def solve(self, game_state, player_number):
+        # (WIN, winning move), (LOSS, None) or (UNKNOWN, None) for the player to move
+        self.nodes = 0
+        if not game_state.has_valid_moves(player_number):
+            return LOSS, None  # already lost, prove() does not store those in self.proven
+        self.searched = {}
+        if len(self.proven) > MAX_PROVEN:
+            self.proven = {}
+        key = game_state.hash ^ SIDE_KEYS[player_number]
+        search_state = game_state.copy()
+        value = UNKNOWN
+        self.budget = self.node_budget  # for the whole solve, self.nodes counts across the deepening iterations
+        try:
+            for depth in range(1, self.max_plies + 1, 2):
+                value = self.prove(search_state, player_number, depth)
+                if value != UNKNOWN:
+                    break
+        except SolverBudget:
+            pass
+        if value == UNKNOWN:
+            return UNKNOWN, None
+        value, move = self.proven[key]
+        if value == WIN and move not in game_state.get_legal_moves(player_number):
+            return UNKNOWN, None  # a key collision
+        return value, move
+
+    def prove(self, game_state, player_number, depth):
+        # WIN, LOSS or UNKNOWN for the player to move within `depth` plies
+        if not game_state.has_valid_moves(player_number):
+            return LOSS
+        if depth == 0:
+            return UNKNOWN
+        key = game_state.hash ^ SIDE_KEYS[player_number]
+        entry = self.proven.get(key)
+        if entry is not None:
+            return entry[0]
+        if self.searched.get(key, -1) >= depth:
+            return UNKNOWN
+        self.nodes += 1
+        if self.nodes > self.budget:
+            raise SolverBudget()
+        opponent = 3 - player_number
+        all_win = True
+        for move in self.order_moves(game_state, player_number):
+            game_state.push_move(move, player_number)
+            value = self.prove(game_state, opponent, depth - 1)
+            game_state.pop_move()
+            if value == LOSS:
+                self.proven[key] = (WIN, move)
+                return WIN
+            if value != WIN:
+                all_win = False
+        if all_win:
+            self.proven[key] = (LOSS, None)
+            return LOSS
+        self.searched[key] = depth
+        return UNKNOWN
+
+    def order_moves(self, game_state, player_number):
+        # stack moves before reserve drops, those most often take the opponent's last moves away
+        reserve = movegen.RESERVE_CELLS[player_number]
+        moves = game_state.get_legal_moves(player_number)
+        return [move for move in moves if move[0] != reserve] + [move for move in moves if move[0] == reserve]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve endgame positions exactly')
+    parser.add_argument('--position', nargs='+', help='position texts, see notation.py; default the suite positions')
+    parser.add_argument('--positions', default=SUITE_POSITIONS, help='positions file, as benchmark.py suite')
+    parser.add_argument('--plies', type=int, default=ENDGAME_PLIES)
+    parser.add_argument('--nodes', type=int, default=ENDGAME_NODES)
+    args = parser.parse_args()
+
+    if args.position:
+        positions = [(text, *position_from_text(text)) for text in args.position]
+    else:
+        positions = [(name, state, player_number)
+                     for name, _, state, player_number in load_suite_positions(args.positions)]
+    names = {WIN: 'win', LOSS: 'loss', UNKNOWN: 'unknown'}
+    for name, state, player_number in positions:
+        solver = EndgameSolver(max_plies=args.plies, node_budget=args.nodes)
+        if not solver.applies(state):
+            print(f"{name}: {state.stack_counts[1] + state.stack_counts[2]} stacks, not an endgame")
+            continue
+        start = time.perf_counter()
+        value, move = solver.solve(state, player_number)
+        print(f"{name}: {names[value]} for player {player_number}" + (f", {move_to_text(move)}" if move else '') +
+              f" ({solver.nodes} nodes, {time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
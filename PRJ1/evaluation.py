@@ -0,0 +1,72 @@
+"""
+Weighted evaluation over the board features GameState and PackedGameState keep up to date.
+
+A position is scored for a player as the dot product of FEATURES with a weight vector, so the same
+evaluator is used by the searches and fitted by tune.py. DEFAULT_WEIGHTS reproduce the original
+hand-written evaluation: 10 per stack and 5 per piece the player controls, -5 per opponent piece,
+20 per reserved and 15 per captured piece.
+"""
+import json
+import random
+
+import movegen
+
+FEATURES = ('stacks', 'pieces', 'reserve', 'captured',
+            'opponent_stacks', 'opponent_pieces', 'opponent_reserve', 'opponent_captured')
+DEFAULT_WEIGHTS = (10.0, 5.0, 20.0, 15.0, 0.0, -5.0, 0.0, 0.0)
+DEFAULT_NOISE = 0.1  # random tie-breaking between equal moves, as the original evaluation did
+
+
+def features(game_state, player_number):
+    # FEATURES of the position for player_number, all read in O(1)
+    opponent_number = 3 - player_number
+    return (game_state.stack_counts[player_number],
+            game_state.piece_counts[player_number],
+            game_state.height(*movegen.RESERVE_CELLS[player_number]),
+            game_state.height(*movegen.CAPTURED_CELLS[player_number]),
+            game_state.stack_counts[opponent_number],
+            game_state.piece_counts[opponent_number],
+            game_state.height(*movegen.RESERVE_CELLS[opponent_number]),
+            game_state.height(*movegen.CAPTURED_CELLS[opponent_number]))
+
+
+def load_weights(path):
+    # weights written by tune.py: {"weights": {feature: value, ...}, ...}, missing features keep their default
+    with open(path) as file:
+        named = json.load(file)['weights']
+    unknown = set(named) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown evaluation features: {sorted(unknown)}")
+    return tuple(float(named.get(name, default)) for name, default in zip(FEATURES, DEFAULT_WEIGHTS))
+
+
+def save_weights(path, weights, **info):
+    with open(path, 'w') as file:
+        json.dump({'weights': dict(zip(FEATURES, weights)), **info}, file, indent=2)
+
+
+class WeightedEvaluator:
+    def __init__(self, weights=DEFAULT_WEIGHTS, noise=DEFAULT_NOISE):
+        if isinstance(weights, str):
+            weights = load_weights(weights)
+        if len(weights) != len(FEATURES):
+            raise ValueError(f"Expected {len(FEATURES)} weights ({', '.join(FEATURES)}), got {len(weights)}")
+        self.weights = tuple(float(weight) for weight in weights)
+        self.noise = noise
+
+    def __call__(self, game_state, player_number):
+        # features() written out, this runs at every search leaf
+        opponent_number = 3 - player_number
+        (stacks, pieces, reserve, captured,
+         opponent_stacks, opponent_pieces, opponent_reserve, opponent_captured) = self.weights
+        stack_counts, piece_counts = game_state.stack_counts, game_state.piece_counts
+        height = game_state.height
+        score = stacks * stack_counts[player_number] + pieces * piece_counts[player_number] + \
+            opponent_stacks * stack_counts[opponent_number] + opponent_pieces * piece_counts[opponent_number] + \
+            reserve * height(*movegen.RESERVE_CELLS[player_number]) + \
+            captured * height(*movegen.CAPTURED_CELLS[player_number]) + \
+            opponent_reserve * height(*movegen.RESERVE_CELLS[opponent_number]) + \
+            opponent_captured * height(*movegen.CAPTURED_CELLS[opponent_number])
+        if self.noise:
+            score += random.uniform(-self.noise, self.noise)
+        return score
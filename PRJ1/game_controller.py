@@ -1,8 +1,15 @@
-import time
-
+import random
 import pygame
 from ai import AI
+from ai_worker import AISearch
+import movegen
 import copy
+from notation import write_games
+from search_log import get_logger
+
+log = get_logger('controller')
+
+GAME_RECORD_FILE = 'games.txt'  # the W key appends the current game here, see notation.py
 
 class GameController:
     def __init__(self, game_state, gui):
@@ -13,19 +20,26 @@ class GameController:
         self.players = [AI(), AI()]
         self.ai_player_1 = None  # Initialize to None
         self.ai_player_2 = None  # Initialize to None
+        self.is_human = False
         self.set_player_types()
         self.selected_source = None
         self.selected_destination = None
-        self.is_human = False
         self.tip_algorithms = ['MiniMax', 'AlphaBeta', 'MCTS', 'Variation of MCTS']
         self.suggestion_shown = False
         self.last_suggested_move = None
         self.moves_made = {1: 0, 2: 0}  # Moves made by each player
         self.pieces_captured = {1: 0, 2: 0}
         self.move_times = {1: [], 2: []}
+        self.move_history = []  # every move played, for save_game
+        self.ai_search = None  # AISearch of the AI to move, running on its thread until handle_ai_move gets it
+        self.suggestion_search = None  # AISearch of the S key suggestion
+        # in 'Human vs AI' the AI searches on the human's time (AI.ponder), the P key turns it on and off
+        self.pondering = True
+        self.ponder_search = None
 
     def set_player_types(self):
         mode = self.gui.current_game_mode
+        self.ai_player_1 = self.ai_player_2 = None  # the AIs of the mode chosen in the menu, none for humans
         if mode == 'Human vs Human':
             self.is_human = {1: True, 2: True}
         elif mode == 'Human vs AI':
@@ -53,12 +67,23 @@ class GameController:
                     self.gui.draw_info_panel(self.current_player, self.score)
                 elif event.key == pygame.K_s:
                     self.show_move_suggestion()
+                elif event.key == pygame.K_w:
+                    self.save_game()
+                elif event.key == pygame.K_p:
+                    self.pondering = not self.pondering
+                    log.info("Pondering %s", 'on' if self.pondering else 'off')
+                    if self.pondering:
+                        self.start_pondering()
+                    else:
+                        self.stop_pondering()
 
     def handle_mouse_click(self, pos):
         x, y = pos
         row = y // self.gui.cell_size
         col = x // self.gui.cell_size
 
+        if not self.is_human[self.current_player]:
+            return  # the AI to move is searching, see handle_ai_turn
         if 0 <= row < self.gui.grid_size and 0 <= col < self.gui.grid_size:
             if self.selected_source is None:  # Attempting to select a source
                 if self.can_select_source(row, col):
@@ -79,91 +104,105 @@ class GameController:
                     self.selected_source = None
                     self.selected_destination = None
 
-        self.game_state.print_board()
+        log.debug("Board:\n%s", self.game_state.board_text())
 
     def validate_move(self, source, destination, preview=False):
-        row_s, col_s = source
-        row_d, col_d = destination
-
-        if not (0 <= row_s < self.gui.grid_size and 0 <= col_s < self.gui.grid_size and
-                0 <= row_d < self.gui.grid_size and 0 <= col_d < self.gui.grid_size):
-            return False  # Out of bounds
-
-        if source == destination:
-            return False  # No move
-
-        # Check for sideline piece being moved onto the board
-        if source in [(7, 7), (7, 0)] and self.game_state.is_playable(row_d, col_d):
-            # Allow moving sidelined piece to any playable position
-            return self.game_state.board[row_s][col_s][-1] == self.current_player
-
-        stack = self.game_state.board[row_s][col_s]
-        if not stack or stack[-1] != self.current_player:
-            return False  # Empty stack or not player's piece
-
-        stack_size = len(stack)
-        move_distance = abs(row_s - row_d) + abs(col_s - col_d)
-        if move_distance != stack_size:
-            return False  # Stack size and move distance mismatch
-
-        if not (row_s == row_d or col_s == col_d):
-            return False  # Non-orthogonal move
-
-        return True
+        return movegen.is_valid_move(self.game_state.board, (source, destination), self.current_player)
 
     def perform_move(self, source, destination):
         if not self.validate_move(source, destination):
-            print("Invalid move.")
+            log.warning("Invalid move %s -> %s for player %d", source, destination, self.current_player)
             return
 
-        row_s, col_s = source
-        row_d, col_d = destination
-        moving_stack = self.game_state.board[row_s][col_s]
+        # make_move keeps the Zobrist hash of the state in sync with the board
+        self.game_state.make_move((source, destination), self.current_player)
+        self.move_history.append((source, destination))
+        self.cancel_search('suggestion')
+        self.stop_pondering()
 
-        self.game_state.board[row_d][col_d].extend(moving_stack)
-        self.game_state.board[row_s][col_s] = []
-        self.game_state.redistribute_excess_pieces()
 
-
-        self.gui.draw_board()
-        pygame.display.flip()
+        self.gui.redraw_board()
 
         self.switch_player()
 
 
     def handle_ai_turn(self):
-        # Determine which AI object to use based on the current player
+        # Starts the search of the AI to move on a background thread and returns, so the pygame loop keeps
+        # running; the move comes back as an ai_worker.AI_MOVE_EVENT, played by handle_ai_move
         ai = self.ai_player_1 if self.current_player == 1 else self.ai_player_2
 
-        if ai:  # If the current player is an AI
-            # pygame.time.wait(200)  # Optionally wait a bit to simulate thinking
-            start_time = time.time()
-            ai_move = ai.choose_move(self.game_state, self.current_player)
-
-            move_time = time.time() - start_time
-            self.move_times[self.current_player].append(move_time)
-
-            if ai_move:
-                self.moves_made[self.current_player] += 1
-                src, dest = ai_move
-                src_row, src_col = src
-                dest_row, dest_col = dest
+        if ai and self.ai_search is None and self.has_valid_moves(self.current_player):
+            self.ai_search = AISearch(ai, self.game_state, self.current_player).start()
+            log.debug("AI player %d searching", self.current_player)
 
-                print(f"AI Player {self.current_player} moved from {src} to {dest}.")
-
-                # Highlight source and destination cells
-                self.gui.highlight_cell(src_row, src_col, highlight_color=(255, 0, 0))
-                # pygame.time.wait(100)  # Optionally wait a bit to simulate move animation
-                self.gui.highlight_cell(dest_row, dest_col, highlight_color=(255, 255, 0))
-
-                # Perform the move
-                self.move_pieces(src_row, src_col, dest_row, dest_col)
-
-                self.gui.redraw_board()
-
-                self.switch_player()
-
-            self.game_state.print_board()
+    def handle_ai_move(self, event):
+        search = event.search
+        if search.purpose == 'suggestion':
+            if search is self.suggestion_search:
+                self.suggestion_search = None
+                self.show_suggested_move(search.move)
+            return
+        if search is not self.ai_search:
+            return  # a search of a game that was reset meanwhile
+        self.ai_search = None
+        ai_move = search.move
+        self.move_times[self.current_player].append(search.move_time)
+        if ai_move is None and self.has_valid_moves(self.current_player):
+            # the search failed (logged by AISearch.run) or was stopped before a depth finished: a legal move
+            # keeps the game going, the turn would otherwise never pass and the window would hang
+            ai_move = random.choice(self.game_state.get_legal_moves(self.current_player))
+            log.warning("AI player %d search returned no move, playing %s", self.current_player, ai_move)
+
+        if ai_move:
+            self.moves_made[self.current_player] += 1
+            src, dest = ai_move
+            src_row, src_col = src
+            dest_row, dest_col = dest
+
+            log.info("AI player %d moved from %s to %s in %.2fs", self.current_player, src, dest, search.move_time)
+
+            # Highlight source and destination cells
+            self.gui.highlight_cell(src_row, src_col, highlight_color=(255, 0, 0))
+            # pygame.time.wait(100)  # Optionally wait a bit to simulate move animation
+            self.gui.highlight_cell(dest_row, dest_col, highlight_color=(255, 255, 0))
+
+            # Perform the move
+            self.move_pieces(src_row, src_col, dest_row, dest_col)
+
+            self.gui.redraw_board()
+
+            self.switch_player()
+
+        log.debug("Board:\n%s", self.game_state.board_text())
+
+    def cancel_search(self, purpose=None):
+        # stops the AI turn and/or the suggestion being searched, their events are then never acted on
+        for name in ('ai_search', 'suggestion_search', 'ponder_search'):
+            search = getattr(self, name)
+            if search is not None and purpose in (None, search.purpose):
+                search.cancel()
+                setattr(self, name, None)
+
+    def start_pondering(self):
+        # a human is to move: their AI opponent searches the positions after their likely replies meanwhile
+        opponent = 2 if self.current_player == 1 else 1
+        ai = self.ai_player_1 if opponent == 1 else self.ai_player_2
+        if ai and self.pondering and self.ponder_search is None and self.ai_search is None \
+                and self.has_valid_moves(self.current_player):
+            self.ponder_search = AISearch(ai, self.game_state, opponent, purpose='ponder').start()
+            log.debug("AI player %d pondering", opponent)
+
+    def stop_pondering(self):
+        # waits for the ponder thread to end, the same AI searches its real move next
+        if self.ponder_search is not None:
+            self.ponder_search.cancel(wait=True)
+            self.ponder_search = None
+
+    def save_game(self, path=GAME_RECORD_FILE):
+        # appends the game so far as a game record, unfinished ('*') while both players can still move
+        result = {1: 1.0, -1: 0.0}.get(self.game_state.get_result(1))
+        write_games(path, [{'moves': self.move_history, 'result': result}])
+        log.info("Game of %d moves saved to %s", len(self.move_history), path)
 
     def calculate_average_move_time(self, player):
         if self.move_times[player]:
@@ -172,27 +211,19 @@ class GameController:
 
     def move_pieces(self, src_row, src_col, dest_row, dest_col):
         # move stack from src to dest
-        stack_to_move = self.game_state.board[src_row][src_col]
-        self.game_state.board[dest_row][dest_col].extend(stack_to_move)
-        self.game_state.board[src_row][src_col] = []
-        self.game_state.redistribute_excess_pieces()
+        self.game_state.make_move(((src_row, src_col), (dest_row, dest_col)), self.current_player)
+        self.move_history.append(((src_row, src_col), (dest_row, dest_col)))
 
         self.gui.redraw_board()
 
     def switch_player(self):
         self.current_player = 1 if self.current_player == 2 else 2
 
-        # Debug print to trace player switching
-        print(f"Player switched to {self.current_player}")
+        log.debug("Player switched to %d (%s)", self.current_player,
+                  'human' if self.is_human[self.current_player] else 'AI')
 
-        # Check if the current player is not human before proceeding with AI turn
-        if not self.is_human[self.current_player]:
-            print(f"Player {self.current_player} HHH")
-            # AI turn check and handling
-            if (self.current_player == 1 and self.ai_player_1) or (self.current_player == 2 and self.ai_player_2):
-                self.check_and_handle_ai_turn()
-        else:
-            print(f"Player {self.current_player} is human.")
+        # AI turn check and handling, or pondering while a human is to move
+        self.check_and_handle_ai_turn()
 
     def is_ai_vs_ai_mode(self):
         return self.players[1] == 'AI' and self.players[2] == 'AI'
@@ -203,47 +234,40 @@ class GameController:
             self.handle_ai_turn()
         elif self.current_player == 2 and self.ai_player_2:
             self.handle_ai_turn()
+        else:
+            self.start_pondering()
 
     def show_move_suggestion(self):
-        # Generate move suggestion based on the current algorithm
+        # Generate move suggestion based on the current algorithm, in the background like an AI turn
+        if self.suggestion_search is not None:
+            return
         algo = self.gui.tip_algorithms[self.gui.current_tip_algorithm_index]
-        suggested_move = self.generate_move_suggestion(algo, self.game_state, self.current_player)
+        self.suggestion_search = self.generate_move_suggestion(algo, self.game_state, self.current_player)
 
+    def show_suggested_move(self, suggested_move):
         if suggested_move:
             src, dest = suggested_move
             # Highlight source in purple
             self.gui.highlight_cell(src[0], src[1], highlight_color=(128, 0, 128))
             # Highlight destination in purple
             self.gui.highlight_cell(dest[0], dest[1], highlight_color=(102, 0, 102))
-            pygame.display.flip()
 
     def generate_move_suggestion(self, algorithm, game_state, player_number):
         # Placeholder for generating a move based on the selected algorithm
         # This method should invoke the corresponding algorithm from the AI class and return the suggested move
         # Example:
         ai1 = AI()
-        return ai1.choose_move(game_state, player_number)
+        return AISearch(ai1, game_state, player_number, purpose='suggestion').start()
 
     def update_gui(self):
         self.gui.draw_control_panel(self.current_player, self.score)
         self.gui.draw_info_panel(self.current_player, self.score)
 
     def highlight_possible_moves(self, row, col):
-        if (row, col) in [(7, 7), (7, 0)]:
-            # Highlight all playable positions for sidelined pieces
-            for r in range(self.gui.grid_size):
-                for c in range(self.gui.grid_size):
-                    if self.game_state.is_playable(r, c):
-                        self.gui.highlight_cell(r, c, highlight_color=(0, 255, 0))
-        else:
-            stack_size = len(self.game_state.board[row][col])
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-            for dx, dy in directions:
-                for distance in range(1, stack_size + 1):
-                    new_row, new_col = row + dx * distance, col + dy * distance
-                    if 0 <= new_row < self.gui.grid_size and 0 <= new_col < self.gui.grid_size and self.validate_move(
-                            (row, col), (new_row, new_col), preview=True):
-                        self.gui.highlight_cell(new_row, new_col, highlight_color=(0, 255, 0))
+        # one display update for all the targets, see GUI.update_display
+        for _, (target_row, target_col) in movegen.moves_from(self.game_state.board, (row, col), self.current_player):
+            self.gui.highlight_cell(target_row, target_col, highlight_color=(0, 255, 0), duration=0)
+        self.gui.update_display()
 
     def can_select_source(self, row, col):
         stack = self.game_state.board[row][col]
@@ -275,27 +299,4 @@ class GameController:
         return player1_pieces, player2_pieces
 
     def has_valid_moves(self, player_number):
-        valid_moves = []
-        for row in range(len(self.game_state.board)):
-            for col in range(len(self.game_state.board[row])):
-                if self.game_state.is_playable(row, col) and not (row, col) in [(6, 0), (6, 7)]:
-                    cell = self.game_state.board[row][col]
-                    if cell and cell[-1] == player_number:
-                        if self.can_make_a_move_from(row, col):
-                            return True  # Found at least one valid move
-        return False
-
-    def can_make_a_move_from(self, row, col):
-        stack = self.game_state.board[row][col]
-        stack_size = len(stack)
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
-
-        for dx, dy in directions:
-            new_row, new_col = row + dx * stack_size, col + dy * stack_size
-            if 0 <= new_row < len(self.game_state.board) and 0 <= new_col < len(self.game_state.board[0]):
-                if self.game_state.is_playable(new_row, new_col):
-                    return True  # Found a valid direction to move
-        return False
-
-
-
+        return self.game_state.has_valid_moves(player_number)
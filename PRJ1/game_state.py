@@ -1,10 +1,30 @@
 import copy
 
+import movegen
+from zobrist import board_hash, stack_hash
+
+
+def board_features(board):
+    # (stack_counts, piece_counts) by a full scan, see GameState.__init__
+    stack_counts = [0, 0, 0]
+    piece_counts = [0, 0, 0]
+    for row in board:
+        for stack in row:
+            if stack:
+                stack_counts[stack[-1]] += 1
+                piece_counts[stack[-1]] += len(stack)
+    return stack_counts, piece_counts
+
 
 class GameState:
     def __init__(self, board_size=8):
         self.board_size = board_size
         self.board = self.initialize_board()
+        self.undo_stack = []  # (previous hash, [(cell, previous stack), ...]) per pushed move, see push_move/pop_move
+        self.hash = board_hash(self.board)  # Zobrist hash, kept up to date by make_move/redistribute_excess_pieces
+        # evaluation features, indexed by player and kept up to date like the hash: stacks topped by the player
+        # and the pieces in them, over every cell including the reserve and captured ones
+        self.stack_counts, self.piece_counts = board_features(self.board)
 
     def initialize_board(self):
         board = [[[] for _ in range(self.board_size)] for _ in range(self.board_size)]
@@ -24,68 +44,111 @@ class GameState:
 
         return board
 
-    def make_move(self, move, player_number):
+    def make_move(self, move, player_number, changes=None):
         src, dest = move
         #print(f"{player_number} trying moving stack from {src} to {dest}.")
         src_row, src_col = src
         dest_row, dest_col = dest
         # check if the move is valid - top piece needs to belong to the player making the move
         if self.board[src_row][src_col] and self.board[src_row][src_col][-1] == player_number:
+            if changes is not None:
+                changes.append((src, list(self.board[src_row][src_col])))
+                changes.append((dest, list(self.board[dest_row][dest_col])))
             # moving stack TODO change
-            self.board[dest_row][dest_col].extend(self.board[src_row][src_col])
+            src_stack = self.board[src_row][src_col]
+            dest_index = dest_row * self.board_size + dest_col
+            self.hash ^= stack_hash(src_row * self.board_size + src_col, src_stack)
+            self.hash ^= stack_hash(dest_index, self.board[dest_row][dest_col])
+            self.count_stack(src_stack, -1)
+            self.count_stack(self.board[dest_row][dest_col], -1)
+            self.board[dest_row][dest_col].extend(src_stack)
             self.board[src_row][src_col] = []
+            self.hash ^= stack_hash(dest_index, self.board[dest_row][dest_col])
+            self.count_stack(self.board[dest_row][dest_col], 1)
+
+        self.redistribute_excess_pieces(changes)
+        return self
+
+    def push_move(self, move, player_number):
+        # make_move that remembers every cell it touched, so the search can undo it with pop_move
+        changes = []
+        previous_hash = self.hash
+        self.make_move(move, player_number, changes)
+        self.undo_stack.append((previous_hash, changes))
+        return self
 
-        self.redistribute_excess_pieces()
+    def pop_move(self):
+        # restore the cells in reverse order, the oldest snapshot of a cell wins
+        self.hash, changes = self.undo_stack.pop()
+        for (row, col), stack in reversed(changes):
+            self.count_stack(self.board[row][col], -1)
+            self.board[row][col] = stack
+            self.count_stack(stack, 1)
         return self
 
+    def rehash(self):
+        # needed only after editing self.board directly instead of going through make_move,
+        # recomputes the evaluation features too
+        self.hash = board_hash(self.board)
+        self.stack_counts, self.piece_counts = board_features(self.board)
+        return self.hash
+
+    def count_stack(self, stack, sign):
+        # adds (sign 1) or removes (sign -1) a stack from the evaluation features
+        if stack:
+            owner = stack[-1]
+            self.stack_counts[owner] += sign
+            self.piece_counts[owner] += sign * len(stack)
+
+    def check_features(self):
+        # consistency check: the running features must match a full board scan
+        expected = board_features(self.board)
+        if (self.stack_counts, self.piece_counts) != expected:
+            raise AssertionError(f"evaluation features out of sync: {(self.stack_counts, self.piece_counts)} "
+                                 f"!= {expected}")
+
+    def height(self, row, col):
+        return len(self.board[row][col])
+
     def is_game_over(self):
         return not (self.has_valid_moves(1) or self.has_valid_moves(2))
 
     def get_legal_moves(self, player_number):
-        valid_moves = []
-        for row in range(self.board_size):
-            for col in range(self.board_size):
-                stack = self.board[row][col]
-                if stack and stack[-1] == player_number:  # If the top piece belongs to the player
-                    stack_size = len(stack)
-                    # Determine valid move directions and distances based on stack size
-                    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-                    for d in directions:
-                        for distance in range(1, stack_size + 1):
-                            new_row, new_col = row + d[0] * distance, col + d[1] * distance
-                            if 0 <= new_row < self.board_size and 0 <= new_col < self.board_size:
-                                if self.is_playable(new_row, new_col):  # Ensure move is to a playable cell
-                                    # Check if the move does not result in a stack over 5 pieces
-                                    destination_stack_size = len(self.board[new_row][new_col])
-                                    if destination_stack_size + stack_size <= 5:
-                                        valid_moves.append(((row, col), (new_row, new_col)))
-        return valid_moves
+        return movegen.generate_moves(self.board, player_number)
 
     def update_cell(self, row, col, value):
         self.board[row][col].append(value)
 
+    def board_text(self):
+        return '\n'.join('|' + '|'.join([str(cell) if cell is not None else ' ' for cell in row]) + '|'
+                         for row in self.board)
+
     def print_board(self):
-        for row in self.board:
-            print('|' + '|'.join([str(cell) if cell is not None else ' ' for cell in row]) + '|')
+        print(self.board_text())
         print()
 
     def copy(self):
         return copy.deepcopy(self)
 
     def is_playable(self, row, col):
-        non_playable_cells = [
-            (0, 0), (0, 1), (0, 6), (0, 7),
-            (1, 0), (1, 7),
-            (6, 0), (6, 7),
-            (7, 0), (7, 1), (7, 6), (7, 7)
-        ]
-        return (row, col) not in non_playable_cells
-
-    def redistribute_excess_pieces(self):
+        return movegen.is_playable(row, col)
+
+    def redistribute_excess_pieces(self, changes=None):
         for row in range(self.board_size):
             for col in range(self.board_size):
                 stack = self.board[row][col]
                 if len(stack) > 5:
+                    if changes is not None:
+                        changes.append(((row, col), list(stack)))
+                        for cell in [(7, 7), (7, 0), (6, 7), (6, 0)]:
+                            changes.append((cell, list(self.board[cell[0]][cell[1]])))
+
+                    # hash out every cell this block can touch, hashed back in once it is done
+                    touched = [(row, col), (7, 7), (7, 0), (6, 7), (6, 0)]
+                    for r, c in touched:
+                        self.hash ^= stack_hash(r * self.board_size + c, self.board[r][c])
+                        self.count_stack(self.board[r][c], -1)
+
                     # Calculate how many pieces need to be removed (and therefore, redistributed)
                     excess_count = len(stack) - 5
 
@@ -115,8 +178,11 @@ class GameState:
                         if len(self.board[dest[0]][dest[1]]) > 5:
                             self.board[dest[0]][dest[1]] = self.board[dest[0]][dest[1]][-5:]
 
+                    for r, c in touched:
+                        self.hash ^= stack_hash(r * self.board_size + c, self.board[r][c])
+                        self.count_stack(self.board[r][c], 1)
+
     def get_result(self, player_number):
-        print("GETTING RESULT FOR " + str(player_number) + "")
         """
         Evaluates the game result from the perspective of the given player number.
         Returns 1 for a win, -1 for a loss, and 0 for a draw or if the game is still ongoing.
@@ -141,24 +207,4 @@ class GameState:
 
 
     def has_valid_moves(self, player_number):
-        valid_moves = []
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                if self.is_playable(row, col) and not (row, col) in [(6, 0), (6, 7)]:
-                    cell = self.board[row][col]
-                    if cell and cell[-1] == player_number:
-                        if self.can_make_a_move_from(row, col):
-                            return True  # Found at least one valid move
-        return False
-
-    def can_make_a_move_from(self, row, col):
-        stack = self.board[row][col]
-        stack_size = len(stack)
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
-
-        for dx, dy in directions:
-            new_row, new_col = row + dx * stack_size, col + dy * stack_size
-            if 0 <= new_row < len(self.board) and 0 <= new_col < len(self.board[0]):
-                if self.is_playable(new_row, new_col):
-                    return True  # Found a valid direction to move
-        return False
+        return movegen.has_valid_moves(self.board, player_number)
@@ -1,9 +1,13 @@
 import time
 
 import pygame
+import movegen
+from ai_worker import AI_MOVE_EVENT
 from game_state import GameState
 from game_controller import GameController
 
+FRAME_RATE = 30  # main_loop frames per second, the rest of the time is left to the AI search threads
+
 
 class GUI:
     def __init__(self, game_state: GameState):
@@ -29,9 +33,20 @@ class GUI:
         self.control_panel_height = 100
         self.info_panel_width = 200
         self.font = pygame.font.Font(None, 36)
+        self.clock = pygame.time.Clock()
+        # Dirty-region rendering: every cell is blitted from a cached surface of its colour and stack, and only
+        # when it differs from what the screen shows. Drawing code adds the rectangles it changed to
+        # dirty_rects, and update_display pushes just those to the window instead of flipping all of it.
+        self.cell_surfaces = {}  # (cell colour, playable, stack) -> pre-rendered cell
+        self.drawn_cells = {}  # (row, col) -> cell surface key on screen, None once highlighted
+        self.drawn_panels = {'control': None, 'info': None}  # what the control and info panels show
+        self.drawn_timer = None  # seconds the timer shows
+        self.dirty_rects = []
         self.draw_board()
 
     def reset_game(self):
+        # Stop the AI searches of the old game, their moves are dropped
+        self.game_controller.cancel_search()
         # Reinitialize game state
         self.game_state = GameState(board_size=8)  # Assuming board size is constant, adjust if necessary
         self.game_controller = GameController(self.game_state, self)
@@ -43,22 +58,23 @@ class GUI:
 
 
         # Redraw the board to reflect the reset state
+        self.invalidate()
         self.draw_board()
 
         # Restart the game loop
         self.main_loop()
 
     def draw_board(self):
+        # redraws the cells whose stack changed or that carry a highlight, and the panels when their
+        # content changed; the screen is updated by update_display
         bottom_left = (self.grid_size - 1, 0)
         bottom_right = (self.grid_size - 1, self.grid_size - 1)
 
         for i in range(self.grid_size):
             for j in range(self.grid_size):
-                # rectangle for each cell
-                rect = pygame.Rect(j * self.cell_size, i * self.cell_size, self.cell_size, self.cell_size)
-
                 # background color for each cell
-                if not self.is_playable(i, j):
+                playable = self.is_playable(i, j)
+                if not playable:
                     cell_color = (100, 100, 100)  # gray
                 else:
                     cell_color = (255, 255, 255)  # white for playable cells
@@ -69,40 +85,70 @@ class GUI:
                 elif (i, j) == bottom_right:
                     cell_color = (100, 120, 120)  # g
 
-                pygame.draw.rect(self.screen, cell_color, rect)
-
-                # visual rep of the stack in each cell
-                cell_stack = self.game_state.board[i][j]
-                stack_height = self.cell_size // 6
-                for k in range(len(cell_stack)):
-                    piece_color = (0, 0, 255) if cell_stack[k] == 1 else (255, 255, 0)  # Blue for 1, yellow for 2
-                    piece_x = j * self.cell_size + self.cell_size // 2
-                    piece_y = (i + 1) * self.cell_size - (k + 1) * stack_height + (stack_height // 2)
-                    pygame.draw.circle(self.screen, piece_color, (piece_x, piece_y), self.cell_size // 12)
-
-                # Highlight the borders of playable cells
-                if self.is_playable(i, j):
-                    pygame.draw.rect(self.screen, (0, 0, 0), rect, 1)  # black border for playable cells
-
-        self.draw_control_panel(self.game_controller.current_player, self.game_controller.score)
-        self.draw_info_panel(self.game_controller.current_player, self.game_controller.score)
+                key = (cell_color, playable, tuple(self.game_state.board[i][j]))
+                if self.drawn_cells.get((i, j)) != key:
+                    rect = self.screen.blit(self.cell_surface(key), (j * self.cell_size, i * self.cell_size))
+                    self.drawn_cells[(i, j)] = key
+                    self.dirty_rects.append(rect)
+
+        control_panel = (self.game_controller.current_player, self.current_game_mode, self.current_ai_type,
+                         self.current_ai_type_2, self.current_difficulty)
+        if control_panel != self.drawn_panels['control']:
+            self.draw_control_panel(self.game_controller.current_player, self.game_controller.score)
+            self.drawn_panels['control'] = control_panel
+        if self.current_tip_algorithm_index != self.drawn_panels['info']:
+            self.draw_info_panel(self.game_controller.current_player, self.game_controller.score)
+            self.drawn_panels['info'] = self.current_tip_algorithm_index
         self.draw_timer()
 
+    def cell_surface(self, key):
+        # one cell with its stack, rendered once per colour and stack
+        surface = self.cell_surfaces.get(key)
+        if surface is None:
+            cell_color, playable, cell_stack = key
+            surface = pygame.Surface((self.cell_size, self.cell_size))
+            surface.fill(cell_color)
+
+            # visual rep of the stack in each cell
+            stack_height = self.cell_size // 6
+            for k in range(len(cell_stack)):
+                piece_color = (0, 0, 255) if cell_stack[k] == 1 else (255, 255, 0)  # Blue for 1, yellow for 2
+                piece_x = self.cell_size // 2
+                piece_y = self.cell_size - (k + 1) * stack_height + (stack_height // 2)
+                pygame.draw.circle(surface, piece_color, (piece_x, piece_y), self.cell_size // 12)
+
+            # Highlight the borders of playable cells
+            if playable:
+                pygame.draw.rect(surface, (0, 0, 0), surface.get_rect(), 1)  # black border for playable cells
+            self.cell_surfaces[key] = surface
+        return surface
+
+    def invalidate(self):
+        # the whole window was painted over (menu, end of game block), draw_board repaints everything
+        self.drawn_cells = {}
+        self.drawn_panels = {'control': None, 'info': None}
+        self.drawn_timer = None
+
+    def update_display(self):
+        # pushes the rectangles drawn since the last update to the window
+        if self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+            self.dirty_rects = []
+
     def draw_timer(self):
         if not self.game_ended:  # Only update the timer if the game hasn't ended
             elapsed_time = int(time.time() - self.start_time)
+            if elapsed_time == self.drawn_timer:
+                return
+            self.drawn_timer = elapsed_time
+            timer_rect = pygame.Rect(self.window_size[0] - self.info_panel_width, 130, self.info_panel_width, 30)
+            pygame.draw.rect(self.screen, (200, 200, 200), timer_rect)  # info panel background
             timer_text_surface = self.font.render(f'Time: {elapsed_time}s', True, (0, 255, 0))
             self.screen.blit(timer_text_surface, (self.window_size[0] - self.info_panel_width + 10, 130))
+            self.dirty_rects.append(timer_rect)
 
     def is_playable(self, row, col):
-        non_playable_cells = [
-            (0, 0), (0, 1), (0, 6), (0, 7),
-            (1, 0), (1, 7),
-            (6, 0), (6, 7),
-            (7, 0), (7, 1), (7, 6), (7, 7)
-        ]
-
-        return (row, col) not in non_playable_cells
+        return movegen.is_playable(row, col)
 
     def draw_ai_selection_menu(self):
         self.screen.fill((0, 0, 0))  # Clear screen or use a background color
@@ -230,6 +276,7 @@ class GUI:
         control_panel_rect = pygame.Rect(0, self.grid_size * self.cell_size,
                                          self.window_size[0] - self.info_panel_width, self.control_panel_height)
         pygame.draw.rect(self.screen, (200, 200, 200), control_panel_rect)
+        self.dirty_rects.append(control_panel_rect)
 
         # Mode and current player info
         mode_text_surface = self.font.render(f'Mode: {self.current_game_mode}', True, (0, 0, 0))
@@ -262,6 +309,8 @@ class GUI:
         info_panel_rect = pygame.Rect(self.window_size[0] - self.info_panel_width, 0, self.info_panel_width,
                                       self.window_size[1])
         pygame.draw.rect(self.screen, (200, 200, 200), info_panel_rect)
+        self.dirty_rects.append(info_panel_rect)
+        self.drawn_timer = None  # painted over
         info_text_surface = self.font.render(f'FOCUS', True, (0, 0, 0))
         self.screen.blit(info_text_surface, (self.window_size[0] - self.info_panel_width + 10, 10))
         tips_text_surface = self.font.render('TIPS', True, (0, 0, 0))
@@ -273,21 +322,22 @@ class GUI:
     def highlight_cell(self, row, col, highlight_color=(255, 255, 0), duration=100):
         rect = pygame.Rect(col * self.cell_size, row * self.cell_size, self.cell_size, self.cell_size)
         pygame.draw.rect(self.screen, highlight_color, rect, 5)  # thick border for highlight
-        # if no duration, don't wait and don't flip the display
+        self.drawn_cells[(row, col)] = None  # the next draw_board repaints the cell without the border
+        self.dirty_rects.append(rect)
+        # if no duration, don't wait and don't update the display
         if duration > 0:
-            pygame.display.flip()  # updating the display to show the highlight move
+            self.update_display()  # updating the display to show the highlight move
             # pygame.time.wait(duration)
 
     def update_game_state(self, row, col, player):
         if len(self.game_state.board[row][col]) >= 5:
             self.redistribute_pieces(row, col)
         self.game_state.board[row][col].append(player)
-        self.draw_board()
-        pygame.display.flip()
+        self.redraw_board()
 
     def redraw_board(self):
         self.draw_board()
-        pygame.display.flip()
+        self.update_display()
 
     def redistribute_pieces(self, row, col):
         # Initialize bottom corners
@@ -319,11 +369,18 @@ class GUI:
         while running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.game_controller.cancel_search()
                     running = False
+                elif event.type == AI_MOVE_EVENT:
+                    # an AI search finished on its thread, see ai_worker.AISearch
+                    self.game_controller.handle_ai_move(event)
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:  # Check for ESC key
                         self.reset_game()  # Reset and restart the game
                         return
+                    # Directly forward keyboard events to the game controller if the game has started
+                    if self.game_started:
+                        self.game_controller.handle_event(event)
 
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     x, y = event.pos
@@ -337,19 +394,17 @@ class GUI:
                         if self.window_size[0] - 200 <= x <= self.window_size[0] and \
                                 self.window_size[1] - 100 <= y <= self.window_size[1]:
                             self.game_started = True
+                            self.game_controller.set_player_types()
+                            self.invalidate()
                             self.draw_board()
+                            self.game_controller.check_and_handle_ai_turn()  # AI vs AI starts by itself
 
                     # If the game has already started, handle game-related events
                     elif self.game_started:
-                        self.game_controller.set_player_types()
                         if self.game_controller.is_ai_vs_ai_mode:
                             self.game_controller.handle_event(event)
                         else:
                             self.game_controller.handle_event(event)
-                elif event.type == pygame.KEYDOWN:
-                    # Directly forward keyboard events to the game controller if the game has started
-                    if self.game_started:
-                        self.game_controller.handle_event(event)
 
             if not self.game_ended and self.game_started:
                 self.game_ended = self.game_controller.check_game_end()
@@ -359,5 +414,6 @@ class GUI:
                 self.draw_ai_selection_menu()
             elif not self.game_ended:
                 self.draw_timer()
-            pygame.display.flip()
+                self.update_display()
+            self.clock.tick(FRAME_RATE)
         pygame.quit()
@@ -1,9 +1,15 @@
+import os
+
 from game_state import GameState
 from game_logic import GameLogic
 from ai import AI
 from gui import GUI
+from search_log import configure
 
 def main():
+    # silent unless IA_LOG_LEVEL is set, e.g. IA_LOG_LEVEL=INFO for one line per AI move, TRACE for MCTS iterations
+    if os.environ.get('IA_LOG_LEVEL'):
+        configure(os.environ['IA_LOG_LEVEL'])
     game_state = GameState(board_size=8)
     game_logic = GameLogic(game_state)
     ai_player = AI(difficulty='medium')
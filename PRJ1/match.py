@@ -0,0 +1,219 @@
+"""
+Headless matches and round-robin tournaments between AI configurations, without pygame.
+
+Every pair of players meets for --games games, colours alternated, the games spread over a process
+pool. A game starts with a few random plies so the games differ, then each side plays its AI until
+the player to move has no stack move left (that player loses) or --max-plies is reached (a draw).
+Results, game lengths and per-move timings are written as CSV (one row per game) and/or JSON, the games
+themselves as notation.py game records, and the players get Elo ratings with approximate 95% intervals.
+
+Players are given as Strategy[:difficulty][:option=value...], options being AI keyword arguments:
+
+python3 match.py AlphaBeta:Medium MCTS:Medium:mcts_iterations=300 --games 20 --workers 4 --csv games.csv
+python3 match.py MiniMax:Easy AlphaBeta:Easy AlphaBeta:Hard --games 10 --json tournament.json
+"""
+import argparse
+import ast
+import csv
+import json
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+from ai import AI
+from notation import write_games
+from packed_state import PackedGameState
+
+MAX_GAME_PLIES = 300
+OPENING_PLIES = 4
+ELO_SCALE = 400 / math.log(10)
+
+
+def parse_player(spec):
+    # 'AlphaBeta:Hard:tt_size=4096' -> {'strategy': 'AlphaBeta', 'difficulty': 'Hard', 'tt_size': 4096}
+    strategy, *rest = spec.split(':')
+    config = {'strategy': strategy}
+    for part in rest:
+        if '=' in part:
+            key, value = part.split('=', 1)
+            try:
+                config[key] = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                config[key] = value
+        else:
+            config['difficulty'] = ast.literal_eval(part) if part[:1].isdigit() else part
+    return config
+
+
+def play_game(config_1, config_2, seed, max_plies=MAX_GAME_PLIES, opening_plies=OPENING_PLIES):
+    # One game, player 1 with AI(**config_1). Returns a record with the result for player 1 (1, 0.5 or 0),
+    # the winner (0 for a draw), the moves and the seconds every AI move took.
+    random.seed(seed)
+    players = {1: AI(**config_1), 2: AI(**config_2)}
+    state = PackedGameState()
+    player_number = 1
+    moves = []
+    move_times = {1: [], 2: []}
+    try:
+        for ply in range(max_plies):
+            if not state.has_valid_moves(player_number):
+                break
+            if ply < opening_plies:
+                move = random.choice(state.get_legal_moves(player_number))
+            else:
+                start = time.perf_counter()
+                move = players[player_number].choose_move(state, player_number)
+                move_times[player_number].append(time.perf_counter() - start)
+                if move is None:
+                    break
+            state.make_move(move, player_number)
+            moves.append(move)
+            player_number = 3 - player_number
+    finally:
+        for ai in players.values():
+            ai.close()
+    result = (state.get_result(1) + 1) / 2
+    return {'seed': seed, 'result': result, 'winner': {1.0: 1, 0.0: 2}.get(result, 0), 'plies': len(moves),
+            'moves': moves, 'move_times': move_times}
+
+
+def run_tournament(pool, specs, games, seed=1, max_plies=MAX_GAME_PLIES, opening_plies=OPENING_PLIES):
+    # every pair of specs plays `games` games, colours alternated; returns the game records in a fixed order
+    configs = {spec: parse_player(spec) for spec in specs}
+    jobs = []
+    for first, second in combinations(specs, 2):
+        for game in range(games):
+            player_1, player_2 = (first, second) if game % 2 == 0 else (second, first)
+            # both colour assignments of a pairing share the seed, so they get the same random opening
+            game_seed = seed + game // 2
+            future = pool.submit(play_game, configs[player_1], configs[player_2], game_seed, max_plies,
+                                 opening_plies)
+            jobs.append((player_1, player_2, future))
+    records = []
+    for number, (player_1, player_2, future) in enumerate(jobs, 1):
+        records.append({'game': number, 'player1': player_1, 'player2': player_2, **future.result()})
+    return records
+
+
+def elo_ratings(records, players):
+    # Bradley-Terry fit of the results (draws count half), ratings centred on 0, one virtual draw per pair so
+    # a player who won every game still gets a finite rating. Returns {player: (rating, 95% half-interval)}.
+    index = {player: i for i, player in enumerate(players)}
+    count = len(players)
+    games = [[0.0] * count for _ in range(count)]
+    scores = [0.0] * count
+    for record in records:
+        i, j = index[record['player1']], index[record['player2']]
+        games[i][j] += 1
+        games[j][i] += 1
+        scores[i] += record['result']
+        scores[j] += 1 - record['result']
+    for i, j in combinations(range(count), 2):
+        if games[i][j]:
+            games[i][j] += 1
+            games[j][i] += 1
+            scores[i] += 0.5
+            scores[j] += 0.5
+    ratings = [0.0] * count
+    information = [0.0] * count
+    for _ in range(200):
+        for i in range(count):
+            expected = 0.0
+            information[i] = 0.0
+            for j in range(count):
+                if games[i][j]:
+                    p = 1 / (1 + 10 ** ((ratings[j] - ratings[i]) / 400))
+                    expected += games[i][j] * p
+                    information[i] += games[i][j] * p * (1 - p)
+            if information[i]:
+                ratings[i] += ELO_SCALE * (scores[i] - expected) / information[i]
+        mean = sum(ratings) / count
+        ratings = [rating - mean for rating in ratings]
+    return {player: (ratings[i], 1.96 * ELO_SCALE / math.sqrt(information[i]) if information[i] else math.inf)
+            for player, i in index.items()}
+
+
+def summarize(records, players):
+    # per player: games, wins, draws, losses, score and average seconds per move
+    summary = {player: {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0, 'score': 0.0, 'move_times': []}
+               for player in players}
+    for record in records:
+        for number, player in ((1, record['player1']), (2, record['player2'])):
+            entry = summary[player]
+            score = record['result'] if number == 1 else 1 - record['result']
+            entry['games'] += 1
+            entry['score'] += score
+            entry['wins' if score == 1 else 'losses' if score == 0 else 'draws'] += 1
+            entry['move_times'].extend(record['move_times'][number])
+    for entry in summary.values():
+        times = entry.pop('move_times')
+        entry['mean_move_time'] = sum(times) / len(times) if times else 0.0
+        entry['max_move_time'] = max(times, default=0.0)
+    return summary
+
+
+def write_csv(path, records):
+    fields = ['game', 'player1', 'player2', 'seed', 'result', 'winner', 'plies', 'moves_1', 'moves_2',
+              'time_1', 'time_2', 'max_move_time_1', 'max_move_time_2']
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        for record in records:
+            row = {field: record[field] for field in fields[:7]}
+            for number in (1, 2):
+                times = record['move_times'][number]
+                row[f'moves_{number}'] = len(times)
+                row[f'time_{number}'] = round(sum(times), 4)
+                row[f'max_move_time_{number}'] = round(max(times, default=0.0), 4)
+            writer.writerow(row)
+
+
+def write_json(path, records, summary, ratings):
+    with open(path, 'w') as file:
+        json.dump({'players': {player: dict(summary[player], elo=rating, elo_interval=interval)
+                               for player, (rating, interval) in ratings.items()},
+                   'games': records}, file, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless AI matches and tournaments')
+    parser.add_argument('players', nargs='+', help='Strategy[:difficulty][:option=value...], two or more')
+    parser.add_argument('--games', type=int, default=10, help='games per pairing, colours alternated')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-plies', type=int, default=MAX_GAME_PLIES, help='plies before a game is a draw')
+    parser.add_argument('--opening-plies', type=int, default=OPENING_PLIES, help='random plies at the start')
+    parser.add_argument('--csv', help='write one row per game to this file')
+    parser.add_argument('--json', help='write the games, moves, timings and ratings to this file')
+    parser.add_argument('--record', help='append the games to this file as notation.py game records')
+    args = parser.parse_args()
+    if len(set(args.players)) < 2:
+        parser.error('at least two different players are needed')
+    players = list(dict.fromkeys(args.players))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        records = run_tournament(pool, players, args.games, args.seed, args.max_plies, args.opening_plies)
+    summary = summarize(records, players)
+    ratings = elo_ratings(records, players)
+
+    print(f"{len(records)} games in {time.perf_counter() - start:.0f}s, "
+          f"{sum(record['plies'] for record in records) / len(records):.0f} plies on average")
+    for player in sorted(players, key=lambda player: -ratings[player][0]):
+        entry = summary[player]
+        rating, interval = ratings[player]
+        print(f"{player:<32} elo {rating:+6.0f} +/- {interval:3.0f}  "
+              f"+{entry['wins']} ={entry['draws']} -{entry['losses']} ({entry['score'] / entry['games']:.0%})  "
+              f"{entry['mean_move_time'] * 1000:.0f} ms/move, max {entry['max_move_time'] * 1000:.0f} ms")
+    if args.csv:
+        write_csv(args.csv, records)
+    if args.json:
+        write_json(args.json, records, summary, ratings)
+    if args.record:
+        write_games(args.record, records)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,94 +1,120 @@
 import math
 
+import numpy as np
 
+import movegen
+
+SELECTION_POLICIES = ('ucb1', 'puct')
+WINS, VISITS = 0, 1  # rows of MCTSNode.child_stats
+NO_CHILDREN = ()  # children of every node not expanded yet
 
 
 class MCTSNode:
-    def __init__(self, game_state, move=None, parent=None, player_number=None):
-        self.game_state = game_state
+    """
+    One node of the MCTS tree, kept small so searches can run 100k+ iterations.
+
+    A node only stores the move that leads to it and its statistics. The game state is not kept:
+    every iteration replays the moves from the root and hands the state to visit()/expand().
+    The legal moves of a node are regenerated when it is expanded, children take them in order
+    from the last one, so len(children) is all the bookkeeping the untried moves need.
+
+    The wins and visits of the children live in one (2, move_count) NumPy array on the parent, row
+    WINS and row VISITS, allocated on the first expansion, so select_child scores every child in one
+    vector operation and a node pays the ndarray overhead once. A node reads its own statistics from
+    its parent's array; only the root keeps them itself. Leaves, most of the tree, share one empty
+    tuple as their children until their first expansion gives them a list.
+    """
+    __slots__ = ('move', 'parent', 'index', 'player_number', 'children', 'move_count', 'terminal',
+                 'child_stats', 'root_wins', 'root_visits')
+
+    def __init__(self, move=None, parent=None, player_number=None, index=0):
         self.move = move
         self.parent = parent
+        self.index = index  # position in the parent's child arrays
         self.player_number = player_number
-        self.children = []
-        self.wins = 0
-        self.visits = 0
-        self.untried_moves = self.get_valid_moves()
-
-    def get_valid_moves(self):
-        valid_moves = []
-        # Handling moves for normal gameplay
-        for row in range(self.game_state.board_size):
-            for col in range(self.game_state.board_size):
-                if self.is_playable(row, col):
-                    stack = self.game_state.board[row][col]
-                    if stack and stack[-1] == self.player_number:
-                        stack_size = len(stack)
-                        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-                        for dx, dy in directions:
-                            # Check positions based on stack size, but don't include current position in distance
-                            target_row = row + dx * stack_size
-                            target_col = col + dy * stack_size
-                            if 0 <= target_row < self.game_state.board_size and 0 <= target_col < self.game_state.board_size:
-                                if self.is_playable(target_row, target_col):
-                                    valid_moves.append(((row, col), (target_row, target_col)))
-        return  valid_moves
-
-    def has_valid_moves(self, player_number):
-        valid_moves = []
-        for row in range(len(self.game_state.board)):
-            for col in range(len(self.game_state.board[row])):
-                if self.game_state.is_playable(row, col) and not (row, col) in [(6, 0), (6, 7)]:
-                    cell = self.game_state.board[row][col]
-                    if cell and cell[-1] == player_number:
-                        if self.can_make_a_move_from(row, col):
-                            return True  # Found at least one valid move
-        return False
-
-    def can_make_a_move_from(self, row, col):
-        stack = self.game_state.board[row][col]
-        stack_size = len(stack)
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
-
-        for dx, dy in directions:
-            new_row, new_col = row + dx * stack_size, col + dy * stack_size
-            if 0 <= new_row < len(self.game_state.board) and 0 <= new_col < len(self.game_state.board[0]):
-                if self.game_state.is_playable(new_row, new_col):
-                    return True  # Found a valid direction to move
-        return False
+        self.children = NO_CHILDREN
+        self.move_count = None  # legal moves of player_number here, set by the first visit()
+        self.terminal = False
+        self.child_stats = None
+        self.root_wins = 0
+        self.root_visits = 0
+
+    @property
+    def wins(self):
+        return self.parent.child_stats[WINS, self.index] if self.parent is not None else self.root_wins
+
+    @wins.setter
+    def wins(self, value):
+        if self.parent is not None:
+            self.parent.child_stats[WINS, self.index] = value
+        else:
+            self.root_wins = value
+
+    @property
+    def visits(self):
+        return self.parent.child_stats[VISITS, self.index] if self.parent is not None else self.root_visits
+
+    @visits.setter
+    def visits(self, value):
+        if self.parent is not None:
+            self.parent.child_stats[VISITS, self.index] = value
+        else:
+            self.root_visits = value
+
+    def detach(self):
+        # makes the node a root, keeping the statistics it had in its parent's arrays
+        if self.parent is not None:
+            self.root_wins = float(self.wins)
+            self.root_visits = float(self.visits)
+            self.parent = None
+
+    def visit(self, state):
+        # called with this node's state whenever an iteration reaches it
+        if self.move_count is None:
+            self.move_count = len(state.get_legal_moves(self.player_number))
+            self.terminal = not state.has_valid_moves(self.player_number)
+
+    def untried_count(self):
+        return self.move_count - len(self.children)
 
     def is_terminal_node(self):
         # Check if the game is over
-        return not self.has_valid_moves(self.player_number)
+        return self.terminal
 
-    def update(self, result):
-        self.visits += 1
+    def update(self, result, visits=1):
+        self.visits += visits
         self.wins += result
-        print(f"Update: Node {self.move} - Wins: {self.wins}, Visits: {self.visits}")
-
-    def select_child(self):
-        selected_child = sorted(
-            self.children,
-            key=lambda c: float('inf') if c.visits == 0 else c.wins / c.visits + math.sqrt(
-                2 * math.log(self.visits) / c.visits)
-        )[-1]
-        print(
-            f"Select Child: Chose {selected_child.move} with Wins/Visits: {selected_child.wins}/{selected_child.visits}")
-        return selected_child
-
-    def expand(self):
-        move = self.untried_moves.pop()
-        print(f"Expand: Expanding with move {move}")
-        next_state = self.game_state.copy().make_move(move, self.player_number)
-        child_node = MCTSNode(next_state, move=move, parent=self, player_number=3 - self.player_number)
+
+    def add_virtual_loss(self, amount):
+        # counted as `amount` lost visits while a tree-parallel playout through this node is in flight
+        self.visits += amount
+        self.wins -= amount
+
+    def select_child(self, exploration=math.sqrt(2), policy='ucb1'):
+        # UCB1: w/n + c * sqrt(ln N / n), unvisited children first
+        # PUCT: w/n + c * P * sqrt(N) / (1 + n) with a uniform prior P over the legal moves
+        count = len(self.children)
+        wins = self.child_stats[WINS, :count]
+        visits = self.child_stats[VISITS, :count]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(visits > 0, wins / visits, 0.0)
+            if policy == 'puct':
+                scores = values + exploration * math.sqrt(max(self.visits, 1)) / (self.move_count * (1 + visits))
+            else:
+                exploration_terms = exploration * np.sqrt(math.log(max(self.visits, 1)) / visits)
+                scores = np.where(visits > 0, values + exploration_terms, np.inf)
+        return self.children[int(np.argmax(scores))]
+
+    def expand(self, state):
+        moves = state.get_legal_moves(self.player_number)
+        if self.child_stats is None:
+            self.child_stats = np.zeros((2, self.move_count))
+            self.children = []
+        index = len(self.children)
+        move = moves[len(moves) - 1 - index]
+        child_node = MCTSNode(move=move, parent=self, player_number=3 - self.player_number, index=index)
         self.children.append(child_node)
-        print(f"Expand: New child with move {move} added. Total children now: {len(self.children)}")
         return child_node
 
     def is_playable(self, row, col):
-        non_playable_cells = [
-            (0, 0), (0, 1), (0, 6), (0, 7),
-            (1, 0), (1, 7),
-            (6, 0), (6, 7),
-            (7, 0), (7, 1), (7, 6), (7, 7)
-        ]
-        return (row, col) not in non_playable_cells
+        return movegen.is_playable(row, col)
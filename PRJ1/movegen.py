@@ -0,0 +1,123 @@
+"""
+Move generation shared by GameState, PackedGameState, the AI, MCTSNode and the GameController.
+
+Rules: the top piece of a stack decides who moves it, and the whole stack moves exactly as many
+cells as it is high, up/down/left/right, onto a playable cell. Pieces sidelined to a player's
+reserve ((7, 7) for player 1, (7, 0) for player 2) can be dropped back on any playable cell.
+Everything that only depends on the board geometry is precomputed once at import.
+"""
+
+BOARD_SIZE = 8
+MAX_HEIGHT = 10  # a destination holds at most 10 pieces before redistribute_excess_pieces trims it
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))  # Up, Down, Left, Right
+
+NON_PLAYABLE_CELLS = frozenset([
+    (0, 0), (0, 1), (0, 6), (0, 7),
+    (1, 0), (1, 7),
+    (6, 0), (6, 7),
+    (7, 0), (7, 1), (7, 6), (7, 7)
+])
+RESERVE_CELLS = {1: (7, 7), 2: (7, 0)}
+CAPTURED_CELLS = {1: (6, 7), 2: (6, 0)}
+
+# frozen playable-cell mask, row-major like the original board scans
+PLAYABLE_CELLS = tuple((row, col) for row in range(BOARD_SIZE) for col in range(BOARD_SIZE)
+                       if (row, col) not in NON_PLAYABLE_CELLS)
+PLAYABLE_MASK = tuple(tuple((row, col) not in NON_PLAYABLE_CELLS for col in range(BOARD_SIZE))
+                      for row in range(BOARD_SIZE))
+
+
+def _build_ray_moves():
+    # RAY_MOVES[(row, col)][height] = every (src, dest) move a stack of that height has from the cell
+    table = {}
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            by_height = [()]
+            for height in range(1, MAX_HEIGHT + 1):
+                moves = []
+                for dx, dy in DIRECTIONS:
+                    target_row, target_col = row + dx * height, col + dy * height
+                    if 0 <= target_row < BOARD_SIZE and 0 <= target_col < BOARD_SIZE and \
+                            PLAYABLE_MASK[target_row][target_col]:
+                        moves.append(((row, col), (target_row, target_col)))
+                by_height.append(tuple(moves))
+            table[(row, col)] = tuple(by_height)
+    return table
+
+
+RAY_MOVES = _build_ray_moves()
+DROP_MOVES = {player: tuple((reserve, cell) for cell in PLAYABLE_CELLS) for player, reserve in RESERVE_CELLS.items()}
+_PLAYABLE_RAYS = tuple((cell, RAY_MOVES[cell]) for cell in PLAYABLE_CELLS)
+
+
+def is_playable(row, col):
+    return 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE and PLAYABLE_MASK[row][col]
+
+
+def generate_moves(board, player_number):
+    moves = []
+    for (row, col), rays in _PLAYABLE_RAYS:
+        stack = board[row][col]
+        if stack and stack[-1] == player_number:
+            moves.extend(rays[len(stack)])
+    reserve_row, reserve_col = RESERVE_CELLS[player_number]
+    if board[reserve_row][reserve_col]:
+        moves.extend(DROP_MOVES[player_number])
+    return moves
+
+
+def has_valid_moves(board, player_number):
+    # a player without any stack move on the board has lost, reserve drops do not count
+    for (row, col), rays in _PLAYABLE_RAYS:
+        stack = board[row][col]
+        if stack and stack[-1] == player_number and rays[len(stack)]:
+            return True
+    return False
+
+
+def moves_from(board, cell, player_number):
+    # legal moves of the stack (or reserve) at `cell`, used to highlight targets in the GUI
+    row, col = cell
+    if cell == RESERVE_CELLS[player_number]:
+        return list(DROP_MOVES[player_number]) if board[row][col] else []
+    stack = board[row][col]
+    if not PLAYABLE_MASK[row][col] or not stack or stack[-1] != player_number:
+        return []
+    return list(RAY_MOVES[cell][len(stack)])
+
+
+def is_valid_move(board, move, player_number):
+    src, dest = move
+    for row, col in (src, dest):
+        if not (0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE):
+            return False  # Out of bounds
+    return move in moves_from(board, src, player_number)
+
+
+def reference_moves(board, player_number):
+    """
+    The same rules written as a plain board scan, without any precomputed table. Kept as the
+    reference the optimized generators are checked against.
+    """
+    valid_moves = []
+    size = len(board)
+    for row in range(size):
+        for col in range(size):
+            if (row, col) not in NON_PLAYABLE_CELLS:
+                stack = board[row][col]
+                if stack and stack[-1] == player_number:
+                    stack_size = len(stack)
+                    for dx, dy in DIRECTIONS:
+                        target_row = row + dx * stack_size
+                        target_col = col + dy * stack_size
+                        if 0 <= target_row < size and 0 <= target_col < size:
+                            if (target_row, target_col) not in NON_PLAYABLE_CELLS:
+                                valid_moves.append(((row, col), (target_row, target_col)))
+
+    sideline_src = RESERVE_CELLS[player_number]
+    if board[sideline_src[0]][sideline_src[1]]:
+        for row in range(size):
+            for col in range(size):
+                if (row, col) not in NON_PLAYABLE_CELLS:
+                    valid_moves.append((sideline_src, (row, col)))
+    return valid_moves
@@ -0,0 +1,204 @@
+"""
+Position notation, move notation, game records and binary position files.
+
+Position text, FEN-like: the 8 rows top to bottom separated by '/', then the player to move. A row
+lists its 8 cells left to right: a digit is that many empty cells, 'x' and 'o' are single pieces of
+player 1 and player 2, and a taller stack is written bottom to top in brackets, '(xxo)'. The reserve
+and captured cells are ordinary cells of the board, so they are part of the text:
+
+8/1xooxxo1/1oxxoox1/1xooxxo1/1oxxoox1/1xooxxo1/1oxxoox1/8 1        (the start position)
+
+A move is its source and destination as four digits row, column, row, column: '2324', and '7733'
+drops the reserve of player 1 on (3, 3). A game record is one line: the start position, the moves
+and the result ('1-0', '0-1', '1/2' or '*' while unfinished) separated by ' ; ', lines starting
+with '#' are comments.
+
+Binary positions are POSITION_BYTES each: the 64 PackedGameState cell bytes and the player to move,
+after an 8 byte header. read_positions maps a whole file into a NumPy array in one call, rows that
+BatchRollouts can play directly, so self-play data can be kept at millions of positions per file.
+"""
+import os
+
+import numpy as np
+
+import movegen
+from game_state import GameState
+from packed_state import PackedGameState, MAX_STACK
+
+PIECE_CHARS = {1: 'x', 2: 'o'}
+CHAR_PIECES = {char: piece for piece, char in PIECE_CHARS.items()}
+RESULTS = {1.0: '1-0', 0.0: '0-1', 0.5: '1/2'}  # result for player 1 -> record text, '*' when unfinished
+RECORD_SEPARATOR = ' ; '
+POSITIONS_MAGIC = b'IAPOS\x00\x00\x01'
+POSITION_BYTES = movegen.BOARD_SIZE * movegen.BOARD_SIZE + 1
+
+
+def position_to_text(game_state, player_number):
+    # works for GameState and PackedGameState alike, through their list of lists board
+    rows = []
+    for row in game_state.board:
+        text = ''
+        empty = 0
+        for stack in row:
+            if not stack:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            pieces = ''.join(PIECE_CHARS[piece] for piece in stack)
+            text += pieces if len(stack) == 1 else f"({pieces})"
+        rows.append(text + (str(empty) if empty else ''))
+    return f"{'/'.join(rows)} {player_number}"
+
+
+START_POSITION = position_to_text(GameState(), 1)
+
+
+def board_from_text(text):
+    # (list of lists board, player to move) of a position text, ValueError when it is not one
+    try:
+        rows_text, player_text = text.split()
+    except ValueError:
+        raise ValueError(f"Expected '<rows> <player to move>': {text!r}") from None
+    if player_text not in ('1', '2'):
+        raise ValueError(f"Player to move must be 1 or 2: {text!r}")
+    board = []
+    for row_text in rows_text.split('/'):
+        row = []
+        index = 0
+        while index < len(row_text):
+            char = row_text[index]
+            if char.isdigit():
+                row.extend([] for _ in range(int(char)))
+            elif char in CHAR_PIECES:
+                row.append([CHAR_PIECES[char]])
+            elif char == '(':
+                end = row_text.find(')', index)
+                stack = row_text[index + 1:end] if end > index else ''
+                if not stack or any(piece not in CHAR_PIECES for piece in stack):
+                    raise ValueError(f"Bad stack at {row_text[index:]!r} in {text!r}")
+                row.append([CHAR_PIECES[piece] for piece in stack])
+                index = end
+            else:
+                raise ValueError(f"Unexpected {char!r} in {text!r}")
+            index += 1
+        if len(row) != movegen.BOARD_SIZE:
+            raise ValueError(f"Row {row_text!r} has {len(row)} cells, not {movegen.BOARD_SIZE}")
+        board.append(row)
+    if len(board) != movegen.BOARD_SIZE:
+        raise ValueError(f"Expected {movegen.BOARD_SIZE} rows: {text!r}")
+    for row, col in movegen.NON_PLAYABLE_CELLS:
+        if board[row][col] and (row, col) not in movegen.RESERVE_CELLS.values() and \
+                (row, col) not in movegen.CAPTURED_CELLS.values():
+            raise ValueError(f"Pieces on the non playable cell {(row, col)}: {text!r}")
+    if any(len(stack) > MAX_STACK for row in board for stack in row):
+        raise ValueError(f"Stacks hold at most {MAX_STACK} pieces: {text!r}")
+    return board, int(player_text)
+
+
+def position_from_text(text, new_state=PackedGameState):
+    # (state, player to move), new_state is PackedGameState or GameState
+    board, player_number = board_from_text(text)
+    state = new_state()
+    if isinstance(state, PackedGameState):
+        state.load_board(board)
+    else:
+        state.board = board
+        state.rehash()
+    return state, player_number
+
+
+def move_to_text(move):
+    (src_row, src_col), (dest_row, dest_col) = move
+    return f"{src_row}{src_col}{dest_row}{dest_col}"
+
+
+def move_from_text(text):
+    if len(text) != 4 or not text.isdigit():
+        raise ValueError(f"A move is four digits, source and destination row and column: {text!r}")
+    src_row, src_col, dest_row, dest_col = (int(char) for char in text)
+    return (src_row, src_col), (dest_row, dest_col)
+
+
+def game_to_text(moves, result=None, start=START_POSITION):
+    # one record line; result is the score of player 1 (1, 0.5 or 0), None while unfinished
+    return RECORD_SEPARATOR.join((start, ' '.join(move_to_text(move) for move in moves), RESULTS.get(result, '*')))
+
+
+def game_from_text(line):
+    # {'start': position text, 'moves': [...], 'result': score of player 1 or None}
+    try:
+        start, moves, result = line.strip().split(RECORD_SEPARATOR.strip())
+    except ValueError:
+        raise ValueError(f"Expected '<position> ; <moves> ; <result>': {line!r}") from None
+    scores = {text: score for score, text in RESULTS.items()}
+    if result.strip() not in scores and result.strip() != '*':
+        raise ValueError(f"Unknown result {result.strip()!r}")
+    board_from_text(start.strip())
+    return {'start': start.strip(), 'moves': [move_from_text(move) for move in moves.split()],
+            'result': scores.get(result.strip())}
+
+
+def replay_game(record, new_state=PackedGameState):
+    # (state, player to move) after every move of a record, the start position first; the state is the
+    # same object throughout, copy it to keep one
+    state, player_number = position_from_text(record['start'], new_state)
+    yield state, player_number
+    for move in record['moves']:
+        if move not in state.get_legal_moves(player_number):
+            raise ValueError(f"Illegal move {move_to_text(move)} for player {player_number}")
+        state.make_move(move, player_number)
+        player_number = 3 - player_number
+        yield state, player_number
+
+
+def write_games(path, records, append=True):
+    # records as game_from_text returns them
+    with open(path, 'a' if append else 'w') as file:
+        for record in records:
+            file.write(game_to_text(record['moves'], record['result'], record.get('start', START_POSITION)) + '\n')
+
+
+def read_games(path):
+    with open(path) as file:
+        return [game_from_text(line) for line in file if line.strip() and not line.startswith('#')]
+
+
+def pack_position(game_state, player_number):
+    # POSITION_BYTES bytes: the PackedGameState cells and the player to move
+    if not isinstance(game_state, PackedGameState):
+        game_state = PackedGameState.from_game_state(game_state)
+    return bytes(game_state.cells) + bytes((player_number,))
+
+
+def unpack_position(data):
+    # (PackedGameState, player to move) of pack_position bytes or a row of read_positions
+    data = bytes(data)
+    if len(data) != POSITION_BYTES:
+        raise ValueError(f"A packed position is {POSITION_BYTES} bytes, got {len(data)}")
+    state = PackedGameState()
+    state.load_cells(data[:-1])
+    return state, data[-1]
+
+
+def write_positions(path, positions, append=True):
+    # (state, player to move) pairs, appended after the header of an existing file
+    with open(path, 'ab' if append else 'wb') as file:
+        if file.tell() == 0:
+            file.write(POSITIONS_MAGIC)
+        for game_state, player_number in positions:
+            file.write(pack_position(game_state, player_number))
+
+
+def read_positions(path):
+    # (count, POSITION_BYTES) uint8 array, memory mapped: the cells are row[:-1], the player to move row[-1]
+    with open(path, 'rb') as file:
+        if file.read(len(POSITIONS_MAGIC)) != POSITIONS_MAGIC:
+            raise ValueError(f"{path} is not a positions file")
+    if os.path.getsize(path) == len(POSITIONS_MAGIC):
+        return np.empty((0, POSITION_BYTES), dtype=np.uint8)
+    positions = np.memmap(path, dtype=np.uint8, mode='r', offset=len(POSITIONS_MAGIC))
+    if len(positions) % POSITION_BYTES:
+        raise ValueError(f"{path} is truncated")
+    return positions.reshape(-1, POSITION_BYTES)
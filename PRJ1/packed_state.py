@@ -0,0 +1,263 @@
+import movegen
+from game_state import GameState
+from zobrist import BYTE_KEYS
+
+MAX_STACK = 5
+HEIGHT_SHIFT = 5  # top 3 bits of a cell byte hold the stack height
+COLOUR_MASK = (1 << HEIGHT_SHIFT) - 1  # low 5 bits hold the colours, bit k = piece k from the bottom is player 2
+
+# (cell index, movegen.RAY_MOVES of the cell) for every playable cell
+PLAYABLE_RAYS = tuple((row * movegen.BOARD_SIZE + col, movegen.RAY_MOVES[(row, col)])
+                      for row, col in movegen.PLAYABLE_CELLS)
+
+SPECIAL_CELLS = ((7, 7), (7, 0), (6, 7), (6, 0))
+
+# player whose piece tops the stack encoded by a cell byte, 0 for an empty cell
+BYTE_OWNERS = tuple(0 if value >> HEIGHT_SHIFT == 0 else
+                    (2 if (value >> ((value >> HEIGHT_SHIFT) - 1)) & 1 else 1) for value in range(256))
+
+
+class PackedGameState:
+    """
+    Drop-in alternative to GameState that keeps every stack in a single byte.
+
+    Each cell is encoded as (height << 5) | colours, where bit k of the colours is set when the
+    k-th piece counted from the bottom belongs to player 2. Stacks never hold more than 5 pieces
+    after redistribution, so the whole 8x8 board fits in a 64 byte buffer and copy() is a plain
+    byte copy instead of a deepcopy.
+    """
+
+    def __init__(self, board_size=8):
+        self.board_size = board_size
+        self.cells = bytearray(board_size * board_size)
+        self._board_view = None
+        self.undo_stack = []
+        self.hash = 0
+        self.stack_counts = [0, 0, 0]  # evaluation features, as in GameState
+        self.piece_counts = [0, 0, 0]
+        self.load_board(GameState(board_size).board)
+
+    @classmethod
+    def from_game_state(cls, game_state):
+        state = cls(game_state.board_size)
+        state.load_board(game_state.board)
+        return state
+
+    def load_board(self, board):
+        for row in range(self.board_size):
+            for col in range(self.board_size):
+                self.cells[row * self.board_size + col] = self.encode_stack(board[row][col])
+        self._board_view = None
+        self.rehash()
+
+    def load_cells(self, cells):
+        # 64 cell bytes as self.cells holds them, e.g. from notation.unpack_position
+        self.cells[:] = cells
+        self._board_view = None
+        self.rehash()
+
+    def rehash(self):
+        # Zobrist hash, identical to GameState.hash for the same position, and the evaluation features
+        self.hash = 0
+        for index, value in enumerate(self.cells):
+            self.hash ^= BYTE_KEYS[index][value]
+        self.stack_counts, self.piece_counts = self.scan_features()
+        return self.hash
+
+    def scan_features(self):
+        stack_counts = [0, 0, 0]
+        piece_counts = [0, 0, 0]
+        for value in self.cells:
+            owner = BYTE_OWNERS[value]
+            stack_counts[owner] += 1
+            piece_counts[owner] += value >> HEIGHT_SHIFT
+        stack_counts[0] = piece_counts[0] = 0
+        return stack_counts, piece_counts
+
+    def count_cell(self, value, sign):
+        # adds (sign 1) or removes (sign -1) a cell byte from the evaluation features
+        owner = BYTE_OWNERS[value]
+        if owner:
+            self.stack_counts[owner] += sign
+            self.piece_counts[owner] += sign * (value >> HEIGHT_SHIFT)
+
+    def check_features(self):
+        # consistency check: the running features must match a full scan of the cells
+        expected = self.scan_features()
+        if (self.stack_counts, self.piece_counts) != expected:
+            raise AssertionError(f"evaluation features out of sync: {(self.stack_counts, self.piece_counts)} "
+                                 f"!= {expected}")
+
+    @staticmethod
+    def encode_stack(stack):
+        stack = stack[-MAX_STACK:]
+        colours = 0
+        for k, piece in enumerate(stack):
+            if piece == 2:
+                colours |= 1 << k
+        return (len(stack) << HEIGHT_SHIFT) | colours
+
+    @staticmethod
+    def decode_stack(cell):
+        height = cell >> HEIGHT_SHIFT
+        return [2 if (cell >> k) & 1 else 1 for k in range(height)]
+
+    @property
+    def board(self):
+        # Read-only list of lists view, kept for the GUI and the AI code that indexes stacks directly.
+        # It is rebuilt lazily after a move, so callers must not mutate it.
+        if self._board_view is None:
+            size = self.board_size
+            self._board_view = [[self.decode_stack(self.cells[row * size + col]) for col in range(size)]
+                                for row in range(size)]
+        return self._board_view
+
+    def height(self, row, col):
+        return self.cells[row * self.board_size + col] >> HEIGHT_SHIFT
+
+    def top(self, row, col):
+        cell = self.cells[row * self.board_size + col]
+        height = cell >> HEIGHT_SHIFT
+        if height == 0:
+            return None
+        return 2 if (cell >> (height - 1)) & 1 else 1
+
+    def make_move(self, move, player_number):
+        src, dest = move
+        src_index = src[0] * self.board_size + src[1]
+        dest_index = dest[0] * self.board_size + dest[1]
+        src_cell = self.cells[src_index]
+        src_height = src_cell >> HEIGHT_SHIFT
+        # top piece needs to belong to the player making the move
+        if src_height and (2 if (src_cell >> (src_height - 1)) & 1 else 1) == player_number:
+            dest_cell = self.cells[dest_index]
+            dest_height = dest_cell >> HEIGHT_SHIFT
+            height = dest_height + src_height
+            colours = (dest_cell & COLOUR_MASK) | ((src_cell & COLOUR_MASK) << dest_height)
+            self.count_cell(src_cell, -1)
+            self.count_cell(dest_cell, -1)
+            self.cells[src_index] = 0
+            if height > MAX_STACK:
+                colours = self.redistribute_excess_pieces(colours, height - MAX_STACK)
+                height = MAX_STACK
+            self.cells[dest_index] = (height << HEIGHT_SHIFT) | colours
+            self.count_cell(self.cells[dest_index], 1)
+            self.hash ^= BYTE_KEYS[src_index][src_cell] ^ BYTE_KEYS[src_index][0] ^ \
+                BYTE_KEYS[dest_index][dest_cell] ^ BYTE_KEYS[dest_index][self.cells[dest_index]]
+            self._board_view = None
+        return self
+
+    def push_move(self, move, player_number):
+        # Saves the bytes of the cells the move can change (source, destination and, on overflow,
+        # the sideline/captured cells) so pop_move can restore them.
+        src, dest = move
+        size = self.board_size
+        touched = [src, dest]
+        if (self.cells[src[0] * size + src[1]] >> HEIGHT_SHIFT) + \
+                (self.cells[dest[0] * size + dest[1]] >> HEIGHT_SHIFT) > MAX_STACK:
+            touched.extend(SPECIAL_CELLS)
+        saved = [(row * size + col, self.cells[row * size + col]) for row, col in touched]
+        self.undo_stack.append((self.hash, saved))
+        return self.make_move(move, player_number)
+
+    def pop_move(self):
+        self.hash, changes = self.undo_stack.pop()
+        for index, value in reversed(changes):
+            self.count_cell(self.cells[index], -1)
+            self.cells[index] = value
+            self.count_cell(value, 1)
+        self._board_view = None
+        return self
+
+    def redistribute_excess_pieces(self, colours, excess_count):
+        # Same rules as GameState.redistribute_excess_pieces, on the packed colours of an oversized stack.
+        # The excess comes off the bottom; returns the colours of the trimmed 5 piece stack.
+        kept = colours >> excess_count
+        top_piece = 2 if (kept >> (MAX_STACK - 1)) & 1 else 1
+        if top_piece == 1:
+            sidelined_dest, captured_dest = (7, 7), (6, 7)
+        else:
+            sidelined_dest, captured_dest = (7, 0), (6, 0)
+        for k in range(excess_count):
+            piece = 2 if (colours >> k) & 1 else 1
+            self.append_piece(sidelined_dest if piece == top_piece else captured_dest, piece)
+        return kept
+
+    def append_piece(self, cell, piece):
+        index = cell[0] * self.board_size + cell[1]
+        value = self.cells[index]
+        height = value >> HEIGHT_SHIFT
+        colours = value & COLOUR_MASK
+        if piece == 2:
+            colours |= 1 << height
+        height += 1
+        if height > MAX_STACK:
+            # sideline/captured cells only keep the 5 most recent pieces
+            colours >>= height - MAX_STACK
+            height = MAX_STACK
+        self.hash ^= BYTE_KEYS[index][value] ^ BYTE_KEYS[index][(height << HEIGHT_SHIFT) | colours]
+        self.cells[index] = (height << HEIGHT_SHIFT) | colours
+        self.count_cell(value, -1)
+        self.count_cell(self.cells[index], 1)
+
+    def get_legal_moves(self, player_number):
+        # movegen rules on the packed cells, reading height and top piece straight from the bytes
+        moves = []
+        cells = self.cells
+        for index, rays in PLAYABLE_RAYS:
+            value = cells[index]
+            height = value >> HEIGHT_SHIFT
+            if height and ((value >> (height - 1)) & 1) + 1 == player_number:
+                moves.extend(rays[height])
+        reserve_row, reserve_col = movegen.RESERVE_CELLS[player_number]
+        if cells[reserve_row * self.board_size + reserve_col]:
+            moves.extend(movegen.DROP_MOVES[player_number])
+        return moves
+
+    def is_game_over(self):
+        return not (self.has_valid_moves(1) or self.has_valid_moves(2))
+
+    def has_valid_moves(self, player_number):
+        cells = self.cells
+        for index, rays in PLAYABLE_RAYS:
+            value = cells[index]
+            height = value >> HEIGHT_SHIFT
+            if height and ((value >> (height - 1)) & 1) + 1 == player_number and rays[height]:
+                return True
+        return False
+
+    def get_result(self, player_number):
+        # 1 for a win, -1 for a loss and 0 while the game is still going, as in GameState.get_result
+        if not self.has_valid_moves(player_number):
+            return -1
+        opponent = 2 if player_number == 1 else 1
+        if not self.has_valid_moves(opponent):
+            return 1
+        return 0
+
+    def is_playable(self, row, col):
+        return movegen.is_playable(row, col)
+
+    def copy(self):
+        state = PackedGameState.__new__(PackedGameState)
+        state.board_size = self.board_size
+        state.cells = self.cells[:]
+        state._board_view = None
+        state.undo_stack = []
+        state.hash = self.hash
+        state.stack_counts = self.stack_counts[:]
+        state.piece_counts = self.piece_counts[:]
+        return state
+
+    def to_game_state(self):
+        state = GameState(self.board_size)
+        state.board = [[list(stack) for stack in row] for row in self.board]
+        state.rehash()
+        return state
+
+    def board_text(self):
+        return '\n'.join('|' + '|'.join([str(cell) for cell in row]) + '|' for row in self.board)
+
+    def print_board(self):
+        print(self.board_text())
+        print()
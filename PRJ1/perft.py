@@ -0,0 +1,306 @@
+"""
+Perft: the number of leaf positions of the game tree to a fixed depth, and a harness that walks a
+candidate engine in lockstep with the reference rules to find the first place they disagree.
+
+The reference is the plain rules: movegen.reference_moves on a GameState board, every child made
+with copy() and make_move. A candidate is compared position by position, depth 1 first, so the
+reported divergence is the shallowest one: the move list of every node (duplicates count), whether
+the player to move has lost, the board after every move and again after the undo, and the Zobrist
+hash and evaluation features the candidate keeps incrementally. Any faster move generator or board
+layout can be added to ENGINES and checked before the searches use it.
+
+python3 perft.py                                            # every candidate, every suite position, depth 2
+python3 perft.py --candidate batch --depth 2 --position reserve-endgame
+"""
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+import movegen
+from game_state import GameState
+from notation import position_from_text
+from packed_state import PackedGameState
+from rollout import BatchRollouts, DESTINATIONS, PLAYABLE_INDEX, RESERVE_INDEX, STACK_HEIGHTS
+from zobrist import board_hash
+
+SUITE_POSITIONS = 'bench_positions.json'
+
+
+def perft(game_state, depth, player_number):
+    # leaf positions `depth` plies ahead, with push_move/pop_move; a player without a stack move has lost,
+    # so the tree stops there and the position is not counted
+    if depth == 0:
+        return 1
+    if not game_state.has_valid_moves(player_number):
+        return 0
+    moves = game_state.get_legal_moves(player_number)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game_state.push_move(move, player_number)
+        nodes += perft(game_state, depth - 1, 3 - player_number)
+        game_state.pop_move()
+    return nodes
+
+
+def load_suite_positions(path=SUITE_POSITIONS, new_state=PackedGameState):
+    # [(name, category, state, player to move)] of a positions file, see notation.position_to_text
+    with open(path) as file:
+        entries = json.load(file)
+    positions = []
+    for entry in entries:
+        state, player_number = position_from_text(entry['position'], new_state)
+        positions.append((entry['name'], entry['category'], state, player_number))
+    return positions
+
+
+class ReferenceEngine:
+    # the rules as written first: a board scan for the moves and a deep copy per child
+    name = 'reference'
+
+    def __init__(self):
+        self.parents = []
+
+    def load(self, board):
+        state = GameState()
+        state.board = [[list(stack) for stack in row] for row in board]
+        state.rehash()
+        self.parents = []
+        return state
+
+    def moves(self, state, player_number):
+        return movegen.reference_moves(state.board, player_number)
+
+    def has_moves(self, state, player_number):
+        reserve = movegen.RESERVE_CELLS[player_number]
+        return any(src != reserve for src, _ in self.moves(state, player_number))
+
+    def make(self, state, move, player_number):
+        self.parents.append(state)
+        return state.copy().make_move(move, player_number)
+
+    def unmake(self, state):
+        return self.parents.pop()
+
+    def board(self, state):
+        return state.board
+
+    def check(self, state):
+        pass
+
+
+class GameStateEngine:
+    # GameState as the search uses it: movegen tables, push_move/pop_move, incremental hash and features
+    name = 'game-state'
+
+    def load(self, board):
+        state = GameState()
+        state.board = [[list(stack) for stack in row] for row in board]
+        state.rehash()
+        return state
+
+    def moves(self, state, player_number):
+        return state.get_legal_moves(player_number)
+
+    def has_moves(self, state, player_number):
+        return state.has_valid_moves(player_number)
+
+    def make(self, state, move, player_number):
+        return state.push_move(move, player_number)
+
+    def unmake(self, state):
+        return state.pop_move()
+
+    def board(self, state):
+        return state.board
+
+    def check(self, state):
+        state.check_features()
+        if state.hash != board_hash(state.board):
+            raise AssertionError(f"hash out of sync: {state.hash:#x} != {board_hash(state.board):#x}")
+
+
+class PackedEngine(GameStateEngine):
+    name = 'packed'
+
+    def load(self, board):
+        state = PackedGameState()
+        state.load_board(board)
+        return state
+
+
+class BatchEngine:
+    # the lookup tables and array updates of rollout.BatchRollouts, on a batch of one game
+    name = 'batch'
+
+    def __init__(self):
+        self.rollouts = BatchRollouts(seed=0)
+        self.parents = []
+
+    def load(self, board):
+        self.parents = []
+        packed = PackedGameState()
+        packed.load_board(board)
+        return np.frombuffer(bytes(packed.cells), dtype=np.uint8).reshape(1, -1).copy()
+
+    def moves(self, cells, player_number):
+        size = movegen.BOARD_SIZE
+        bits = BatchRollouts.move_bits(cells, np.array([player_number]))[0]
+        moves = []
+        for position, directions in enumerate(bits.tolist()):
+            source = int(PLAYABLE_INDEX[position])
+            height = STACK_HEIGHTS[cells[0, source]]
+            for direction in range(len(movegen.DIRECTIONS)):
+                if directions >> direction & 1:
+                    moves.append((divmod(source, size), divmod(int(DESTINATIONS[position, height, direction]), size)))
+        reserve = int(RESERVE_INDEX[player_number])
+        if cells[0, reserve]:
+            moves.extend((divmod(reserve, size), divmod(int(target), size)) for target in PLAYABLE_INDEX)
+        return moves
+
+    def has_moves(self, cells, player_number):
+        return bool(BatchRollouts.move_bits(cells, np.array([player_number])).any())
+
+    def make(self, cells, move, player_number):
+        self.parents.append(cells)
+        (src_row, src_col), (dest_row, dest_col) = move
+        size = movegen.BOARD_SIZE
+        child = cells.copy()
+        self.rollouts.apply_moves(child, np.array([0]), np.array([src_row * size + src_col]),
+                                  np.array([dest_row * size + dest_col]), np.array([player_number]))
+        return child
+
+    def unmake(self, cells):
+        return self.parents.pop()
+
+    def board(self, cells):
+        size = movegen.BOARD_SIZE
+        return [[PackedGameState.decode_stack(int(cells[0, row * size + col])) for col in range(size)]
+                for row in range(size)]
+
+    def check(self, cells):
+        pass
+
+
+ENGINES = {engine.name: engine for engine in (GameStateEngine, PackedEngine, BatchEngine)}
+
+
+class Divergence(Exception):
+    def __init__(self, moves, board, kind, detail):
+        super().__init__(f"{kind}: {detail}")
+        self.moves = moves  # path from the checked position, ending with the move that went wrong if one did
+        self.board = board  # reference board the last check started from, before that move
+        self.kind = kind
+        self.detail = detail
+
+
+def frozen(board):
+    return tuple(tuple(tuple(stack) for stack in row) for row in board)
+
+
+def compare(reference, candidate, board, player_number, depth):
+    # Lockstep walk of both engines to `depth` plies from `board`, moves in sorted order. Returns the number of
+    # leaves, raises Divergence at the first difference.
+    path = []
+
+    def diverge(kind, detail, reference_state):
+        return Divergence(list(path), reference.board(reference_state), kind, detail)
+
+    def walk(reference_state, candidate_state, player_number, depth):
+        playing = reference.has_moves(reference_state, player_number)
+        if candidate.has_moves(candidate_state, player_number) != playing:
+            raise diverge('game over', f"player {player_number} has a stack move: reference {playing}, "
+                                       f"{candidate.name} {not playing}", reference_state)
+        if depth == 0:
+            return 1
+        if not playing:
+            return 0
+        reference_moves = Counter(reference.moves(reference_state, player_number))
+        candidate_moves = Counter(candidate.moves(candidate_state, player_number))
+        if reference_moves != candidate_moves:
+            missing = sorted((reference_moves - candidate_moves).elements())
+            extra = sorted((candidate_moves - reference_moves).elements())
+            raise diverge('moves', f"player {player_number}, missing {missing}, extra {extra}", reference_state)
+        parent_board = frozen(reference.board(reference_state))
+        leaves = 0
+        for move in sorted(reference_moves):
+            path.append(move)
+            reference_child = reference.make(reference_state, move, player_number)
+            candidate_child = candidate.make(candidate_state, move, player_number)
+            expected = frozen(reference.board(reference_child))
+            if frozen(candidate.board(candidate_child)) != expected:
+                raise diverge('position', f"board after player {player_number} plays {move} differs: "
+                                          f"{difference(expected, frozen(candidate.board(candidate_child)))}",
+                              reference_state)
+            try:
+                candidate.check(candidate_child)
+            except AssertionError as error:
+                raise diverge('incremental state', f"after player {player_number} plays {move}: {error}",
+                              reference_state)
+            leaves += walk(reference_child, candidate_child, 3 - player_number, depth - 1)
+            reference_state = reference.unmake(reference_child)
+            candidate_state = candidate.unmake(candidate_child)
+            if frozen(candidate.board(candidate_state)) != parent_board:
+                raise diverge('undo', f"board after undoing {move} differs: "
+                                      f"{difference(parent_board, frozen(candidate.board(candidate_state)))}",
+                              reference_state)
+            path.pop()
+        return leaves
+
+    return walk(reference.load(board), candidate.load(board), player_number, depth)
+
+
+def difference(expected, actual):
+    # the cells that differ, as 'cell: expected -> actual'
+    size = len(expected)
+    return ', '.join(f"{(row, col)}: {list(expected[row][col])} -> {list(actual[row][col])}"
+                     for row in range(size) for col in range(size) if expected[row][col] != actual[row][col])
+
+
+def check_engine(candidate, positions, depth):
+    # every position at depth 1, 2... `depth`; returns the first Divergence as (position name, divergence)
+    for name, board, player_number in positions:
+        for current_depth in range(1, depth + 1):
+            start = time.perf_counter()
+            try:
+                leaves = compare(ReferenceEngine(), candidate, board, player_number, current_depth)
+            except Divergence as divergence:
+                return name, divergence
+            print(f"{candidate.name:<10} {name:<18} depth {current_depth}: {leaves} leaves agree "
+                  f"({time.perf_counter() - start:.2f}s)")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Perft comparison of move generators against the reference rules')
+    parser.add_argument('--candidate', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--depth', type=int, default=2, help='plies; every extra ply costs about 50 times more')
+    parser.add_argument('--positions', default=SUITE_POSITIONS, help='positions file, as benchmark.py suite')
+    parser.add_argument('--position', nargs='+', help='only these positions of the file')
+    args = parser.parse_args()
+
+    positions = [(name, state.board, player_number)
+                 for name, _, state, player_number in load_suite_positions(args.positions, GameState)
+                 if not args.position or name in args.position]
+    if not positions:
+        parser.error(f"no such position in {args.positions}")
+    failed = False
+    for name in args.candidate:
+        found = check_engine(ENGINES[name](), positions, args.depth)
+        if found:
+            failed = True
+            position, divergence = found
+            print(f"{name} diverges from the reference in {position} after moves {divergence.moves}")
+            print(f"  {divergence.kind}: {divergence.detail}")
+            print('\n'.join('|' + '|'.join(str(stack) for stack in row) + '|' for row in divergence.board))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Batched random playouts for MCTS: N independent games advanced together with NumPy.
+
+The boards use the PackedGameState byte encoding, one row of 64 cells per game, so a leaf state is
+broadcast into the batch with a plain copy. Everything the move generation needs is looked up in
+tables built once at import: DIRECTION_BITS gives, for a playable cell, a cell byte and a player, the
+4-bit set of directions the stack there can move in. A step sums those per game, draws one legal move
+index per game uniformly, finds its cell with a cumulative sum (or a reserve drop past the stack moves),
+and applies the moves with array operations following the same rules as PackedGameState.make_move.
+
+The 'heuristic' playout policy samples moves by softmax over MOVE_DELTAS, the change a move makes to
+the AI.evaluate_state score of the mover: only the source and destination bytes decide it, so the
+softmax logit delta / temperature of a candidate is a single lookup in a table built once per
+temperature, in the batch and in the serial heuristic_move alike. The largest logit of a choice is
+subtracted before exp, so deltas of up to 120 points stay finite at any positive temperature.
+"""
+import math
+import random
+
+import numpy as np
+
+import movegen
+from packed_state import HEIGHT_SHIFT, COLOUR_MASK, MAX_STACK
+
+BOARD_CELLS = movegen.BOARD_SIZE * movegen.BOARD_SIZE
+MAX_ROLLOUT_STEPS = 600  # same cap as the serial simulation in AI.mcts_iteration
+PLAYOUT_POLICIES = ('random', 'heuristic')
+DEFAULT_PLAYOUT_TEMPERATURE = 10.0  # evaluate_state points; a stack is worth 5 per piece, 10 more on top
+
+
+def _cell_index(cell):
+    return cell[0] * movegen.BOARD_SIZE + cell[1]
+
+
+PLAYABLE_INDEX = np.array([_cell_index(cell) for cell in movegen.PLAYABLE_CELLS])
+PLAYABLE_COUNT = len(PLAYABLE_INDEX)
+PLAYABLE_RANGE = np.arange(PLAYABLE_COUNT)
+# indexed by player number, entry 0 unused
+RESERVE_INDEX = np.array([0] + [_cell_index(movegen.RESERVE_CELLS[player]) for player in (1, 2)])
+CAPTURED_INDEX = np.array([0] + [_cell_index(movegen.CAPTURED_CELLS[player]) for player in (1, 2)])
+
+
+def _build_tables():
+    # DESTINATIONS[playable cell, height, direction] = destination cell index, -1 when off the playable board
+    # DIRECTION_BITS[playable cell, cell byte, player] = directions (bit per movegen.DIRECTIONS entry) the
+    # player's stack encoded by the byte can move in from that cell
+    destinations = np.full((PLAYABLE_COUNT, MAX_STACK + 1, len(movegen.DIRECTIONS)), -1, dtype=np.int64)
+    direction_bits = np.zeros((PLAYABLE_COUNT, 256, 3), dtype=np.uint8)
+    for position, cell in enumerate(movegen.PLAYABLE_CELLS):
+        for height in range(1, MAX_STACK + 1):
+            for direction, (dx, dy) in enumerate(movegen.DIRECTIONS):
+                target = (cell[0] + dx * height, cell[1] + dy * height)
+                if movegen.is_playable(*target):
+                    destinations[position, height, direction] = _cell_index(target)
+        for value in range(256):
+            height = value >> HEIGHT_SHIFT
+            if 0 < height <= MAX_STACK:
+                player = 2 if (value >> (height - 1)) & 1 else 1
+                bits = sum(1 << direction for direction in range(len(movegen.DIRECTIONS))
+                           if destinations[position, height, direction] >= 0)
+                direction_bits[position, value, player] = bits
+    return destinations, direction_bits
+
+
+DESTINATIONS, DIRECTION_BITS = _build_tables()
+# DIRECTION_MASKS[bits] = 0/1 weight of each direction, STACK_HEIGHTS[cell byte] = height capped for DESTINATIONS
+DIRECTION_MASKS = np.array([[(bits >> k) & 1 for k in range(len(movegen.DIRECTIONS))] for bits in range(16)],
+                           dtype=np.float32)
+STACK_HEIGHTS = np.minimum(np.arange(256) >> HEIGHT_SHIFT, MAX_STACK)
+BIT_COUNTS = np.array([bin(bits).count('1') for bits in range(16)], dtype=np.int64)
+# NTH_BIT[bits, n] = position of the n-th set bit of bits
+NTH_BIT = np.array([[[k for k in range(4) if bits >> k & 1][n] if n < bin(bits).count('1') else 0
+                     for n in range(4)] for bits in range(16)], dtype=np.int64)
+
+
+def _piece_values(values, player_number):
+    # evaluate_state's board term of a cell byte: 10 + 5 per piece for the player's stacks, -5 per piece otherwise
+    heights = values >> HEIGHT_SHIFT
+    tops = ((values >> np.maximum(heights - 1, 0)) & 1) + 1
+    return np.where(heights == 0, 0, np.where(tops == player_number, 10 + 5 * heights, -5 * heights))
+
+
+def _build_move_deltas():
+    # MOVE_DELTAS[player, (source byte << 8) | destination byte] = change of the player's evaluate_state score
+    # when the player moves the source stack onto the destination. Pieces pushed out of an oversized stack
+    # count 20 (reserve) or 15 (captured) when they go to the player's cells; the board term of the reserve
+    # and captured cells and their trim to 5 pieces are left out, a lookup on two bytes cannot see them.
+    # A drop also empties the reserve, see drop_penalty.
+    sources = np.arange(256)[:, None]
+    targets = np.arange(256)[None, :]
+    source_heights, target_heights = sources >> HEIGHT_SHIFT, targets >> HEIGHT_SHIFT
+    valid = (source_heights > 0) & (source_heights <= MAX_STACK) & (target_heights <= MAX_STACK)
+    colours = (targets & COLOUR_MASK) | ((sources & COLOUR_MASK) << target_heights)
+    heights = source_heights + target_heights
+    excess = np.maximum(heights - MAX_STACK, 0)
+    kept = colours >> excess
+    merged = (np.minimum(heights, MAX_STACK) << HEIGHT_SHIFT) | kept
+    top_players = ((kept >> (np.minimum(heights, MAX_STACK) - 1).clip(0)) & 1) + 1
+    excess_twos = sum(((colours >> k) & 1) * (excess > k) for k in range(MAX_STACK))
+    sidelined = np.where(top_players == 2, excess_twos, excess - excess_twos)
+    deltas = np.zeros((3, 256 * 256), dtype=np.int64)
+    for player_number in (1, 2):
+        gains = np.where(top_players == player_number, 20 * sidelined + 15 * (excess - sidelined), 0)
+        delta = _piece_values(merged, player_number) - _piece_values(targets, player_number) - \
+            _piece_values(sources, player_number) + gains
+        deltas[player_number] = np.where(valid, delta, 0).ravel()
+    return deltas
+
+
+MOVE_DELTAS = _build_move_deltas()
+# move -> (source index, destination index, is a reserve drop) for heuristic_move
+MOVE_CELLS = {move: (_cell_index(move[0]), _cell_index(move[1]), False)
+              for rays in movegen.RAY_MOVES.values() for moves in rays for move in moves}
+MOVE_CELLS.update({move: (_cell_index(move[0]), _cell_index(move[1]), True)
+                   for moves in movegen.DROP_MOVES.values() for move in moves})
+
+
+def drop_penalty(reserve_values):
+    # a drop moves the whole reserve: evaluate_state loses its 20 points per reserved piece
+    return 20 * (reserve_values >> HEIGHT_SHIFT)
+
+
+_WEIGHT_TABLES = {}
+
+
+def check_temperature(temperature):
+    if not temperature > 0:
+        raise ValueError(f"Playout temperature must be positive: {temperature}")
+
+
+def move_weights(temperature):
+    # (logits, drop logits) for a temperature: logits[(player << 16) | (source byte << 8) | destination byte]
+    # = MOVE_DELTAS / temperature, drop_logits[reserve byte] = -drop_penalty / temperature, -inf when empty;
+    # the softmax weight of a candidate is exp(its logit - the largest logit of the choice)
+    check_temperature(temperature)
+    if temperature not in _WEIGHT_TABLES:
+        logits = MOVE_DELTAS.ravel() / temperature
+        values = np.arange(256)
+        drop_logits = np.where(values >> HEIGHT_SHIFT, -drop_penalty(values) / temperature, -np.inf)
+        _WEIGHT_TABLES[temperature] = (logits, drop_logits, logits.tolist(), drop_logits.tolist())
+    return _WEIGHT_TABLES[temperature]
+
+
+def heuristic_move(cells, moves, player_number, temperature=DEFAULT_PLAYOUT_TEMPERATURE, rng=random):
+    # softmax(MOVE_DELTAS / temperature) pick among `moves` for a PackedGameState's cells
+    _, _, logits, drop_logits = move_weights(temperature)
+    offset = player_number << 16
+    move_logits = []
+    for move in moves:
+        source, target, drop = MOVE_CELLS[move]
+        logit = logits[offset | (cells[source] << 8) | cells[target]]
+        move_logits.append(logit + drop_logits[cells[source]] if drop else logit)
+    top = max(move_logits)
+    return rng.choices(moves, [math.exp(logit - top) for logit in move_logits])[0]
+
+
+class BatchRollouts:
+    def __init__(self, seed=None, max_steps=MAX_ROLLOUT_STEPS, policy='random',
+                 temperature=DEFAULT_PLAYOUT_TEMPERATURE):
+        if policy not in PLAYOUT_POLICIES:
+            raise ValueError(f"Unknown playout policy: {policy}")
+        check_temperature(temperature)
+        self.rng = np.random.default_rng(seed)
+        self.max_steps = max_steps
+        self.policy = policy
+        self.temperature = temperature
+
+    def run(self, game_state, player_to_move, player_number, count):
+        # plays `count` random games from a PackedGameState, returns their results for player_number:
+        # 1 win, -1 loss, 0 still going after max_steps, as PackedGameState.get_result
+        cells = np.tile(np.frombuffer(bytes(game_state.cells), dtype=np.uint8), (count, 1))
+        players = np.full(count, player_to_move, dtype=np.int64)
+        self.play(cells, players)
+        return self.results(cells, player_number)
+
+    def play(self, cells, players):
+        # advances every game until its player to move has no legal move or max_steps are played
+        active = np.arange(len(cells))
+        for _ in range(self.max_steps):
+            sources, targets, has_move = self.choose_moves(cells[active], players[active])
+            if not has_move.all():
+                active, sources, targets = active[has_move], sources[has_move], targets[has_move]
+                if not len(active):
+                    break
+            self.apply_moves(cells, active, sources, targets, players[active])
+            players[active] = 3 - players[active]
+        return cells
+
+    @staticmethod
+    def move_bits(cells, players):
+        # (games, PLAYABLE_COUNT) direction bits of every playable cell for the player of each game
+        return DIRECTION_BITS[PLAYABLE_RANGE, cells[:, PLAYABLE_INDEX], players[:, None]]
+
+    def choose_moves(self, cells, players):
+        # one uniformly random legal move per game as (source, target) cell indices, plus the games that had one
+        if self.policy == 'heuristic':
+            return self.choose_heuristic_moves(cells, players)
+        games = np.arange(len(cells))
+        bits = self.move_bits(cells, players)
+        counts = BIT_COUNTS[bits]
+        ends = counts.cumsum(axis=1)
+        stack_moves = ends[:, -1]
+        reserves = RESERVE_INDEX[players]
+        drops = np.where(cells[games, reserves] > 0, PLAYABLE_COUNT, 0)
+        totals = stack_moves + drops
+        picks = (self.rng.random(len(cells)) * totals).astype(np.int64)
+        # stack moves are numbered cell by cell, the reserve drops come after them
+        positions = np.minimum((ends <= picks[:, None]).sum(axis=1), PLAYABLE_COUNT - 1)
+        offsets = picks - (ends[games, positions] - counts[games, positions])
+        directions = NTH_BIT[bits[games, positions], np.minimum(offsets, 3)]
+        sources = PLAYABLE_INDEX[positions]
+        heights = cells[games, sources] >> HEIGHT_SHIFT
+        stack_targets = DESTINATIONS[positions, np.minimum(heights, MAX_STACK), directions]
+        dropped = picks >= stack_moves
+        sources = np.where(dropped, reserves, sources)
+        targets = np.where(dropped, PLAYABLE_INDEX[np.clip(picks - stack_moves, 0, PLAYABLE_COUNT - 1)],
+                           stack_targets)
+        return sources, targets, totals > 0
+
+    def choose_heuristic_moves(self, cells, players):
+        # same as choose_moves, but every legal move is drawn with probability softmax(MOVE_DELTAS / temperature);
+        # candidates are the 4 directions of every playable cell, then one drop per playable cell
+        logits, drop_logits, _, _ = move_weights(self.temperature)
+        games = np.arange(len(cells))
+        values = cells[:, PLAYABLE_INDEX]
+        bits = DIRECTION_BITS[PLAYABLE_RANGE, values, players[:, None]]
+        targets = DESTINATIONS[PLAYABLE_RANGE, STACK_HEIGHTS[values]]
+        target_values = cells[games[:, None, None], targets]  # -1 reads the last cell, masked by DIRECTION_MASKS
+        keys = ((players[:, None] << 16) | (values.astype(np.int64) << 8))
+        stack_logits = np.where(DIRECTION_MASKS[bits], logits[keys[:, :, None] | target_values], -np.inf)
+        reserves = RESERVE_INDEX[players]
+        reserve_values = cells[games, reserves]
+        drop_logits = logits[(players[:, None] << 16) | (reserve_values.astype(np.int64) << 8)[:, None] | values] + \
+            drop_logits[reserve_values][:, None]
+        candidate_logits = np.concatenate((stack_logits.reshape(len(cells), -1), drop_logits), axis=1)
+        top = candidate_logits.max(axis=1)
+        top[~np.isfinite(top)] = 0.0  # no legal move, every weight is 0
+        ends = np.exp(candidate_logits - top[:, None]).cumsum(axis=1)
+        totals = ends[:, -1]
+        picks = self.rng.random(len(cells)) * totals
+        slots = np.minimum((ends <= picks[:, None]).sum(axis=1), ends.shape[1] - 1)
+        stack_slots = PLAYABLE_COUNT * len(movegen.DIRECTIONS)
+        dropped = slots >= stack_slots
+        positions = np.where(dropped, slots - stack_slots, slots // len(movegen.DIRECTIONS))
+        sources = np.where(dropped, reserves, PLAYABLE_INDEX[positions])
+        targets = np.where(dropped, PLAYABLE_INDEX[positions],
+                           targets[games, positions, np.where(dropped, 0, slots % len(movegen.DIRECTIONS))])
+        return sources, targets, totals > 0
+
+    def apply_moves(self, cells, games, sources, targets, players):
+        # PackedGameState.make_move for one move in each of `games`
+        source_cells = cells[games, sources].astype(np.int64)
+        source_heights = source_cells >> HEIGHT_SHIFT
+        top_bits = (source_cells >> np.maximum(source_heights - 1, 0)) & 1
+        movable = (source_heights > 0) & (top_bits + 1 == players)
+        if not movable.all():
+            games, sources, targets = games[movable], sources[movable], targets[movable]
+            source_cells, source_heights = source_cells[movable], source_heights[movable]
+        target_cells = cells[games, targets].astype(np.int64)
+        target_heights = target_cells >> HEIGHT_SHIFT
+        heights = target_heights + source_heights
+        colours = (target_cells & COLOUR_MASK) | ((source_cells & COLOUR_MASK) << target_heights)
+        cells[games, sources] = 0
+        excess = np.maximum(heights - MAX_STACK, 0)
+        if excess.any():
+            colours = self.redistribute_excess_pieces(cells, games, colours, excess)
+            heights = np.minimum(heights, MAX_STACK)
+        cells[games, targets] = (heights << HEIGHT_SHIFT) | colours
+
+    def redistribute_excess_pieces(self, cells, games, colours, excess):
+        # bottom pieces of the oversized stacks matching the top piece go to its owner's reserve, the others
+        # to the owner's captured cell; returns the colours of the trimmed stacks
+        kept = colours >> excess
+        top_players = np.where((kept >> (MAX_STACK - 1)) & 1 == 1, 2, 1)
+        for k in range(int(excess.max())):
+            selected = excess > k
+            pieces = ((colours[selected] >> k) & 1) + 1
+            owners = top_players[selected]
+            targets = np.where(pieces == owners, RESERVE_INDEX[owners], CAPTURED_INDEX[owners])
+            self.append_pieces(cells, games[selected], targets, pieces)
+        return kept
+
+    @staticmethod
+    def append_pieces(cells, games, targets, pieces):
+        values = cells[games, targets].astype(np.int64)
+        heights = values >> HEIGHT_SHIFT
+        colours = (values & COLOUR_MASK) | ((pieces == 2).astype(np.int64) << heights)
+        heights = heights + 1
+        full = heights > MAX_STACK  # reserve and captured cells only keep the 5 most recent pieces
+        colours = np.where(full, colours >> 1, colours)
+        heights = np.minimum(heights, MAX_STACK)
+        cells[games, targets] = (heights << HEIGHT_SHIFT) | colours
+
+    def results(self, cells, player_number):
+        outcomes = []
+        for player in (player_number, 3 - player_number):
+            players = np.full(len(cells), player, dtype=np.int64)
+            outcomes.append(self.move_bits(cells, players).any(axis=1))
+        player_moves, opponent_moves = outcomes
+        return np.where(~player_moves, -1, np.where(~opponent_moves, 1, 0))
@@ -0,0 +1,35 @@
+"""
+Logging for the game and the AI searches, on top of the standard logging module.
+
+Every module logs under the 'ia' logger, which has no handler by default, so nothing is written
+until configure() is called (main.py does it from the IA_LOG_LEVEL environment variable).
+Per-iteration MCTS traces use the TRACE level, below DEBUG, and only every AI.trace_every-th
+iteration is traced. The search counters (nodes, playouts, depth, time) are kept on the AI and read
+with AI.search_stats() after a move instead of being printed.
+"""
+import logging
+
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
+
+ROOT_LOGGER = 'ia'
+logging.getLogger(ROOT_LOGGER).addHandler(logging.NullHandler())
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def configure(level='INFO', stream=None):
+    # level is a logging level or its name ('TRACE', 'DEBUG', 'INFO', ...)
+    if isinstance(level, str):
+        name, level = level, logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level: {name}")
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    if not any(isinstance(handler, logging.StreamHandler) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(relativeCreated)8.0fms %(levelname)-5s %(name)s: %(message)s'))
+        logger.addHandler(handler)
+    return logger
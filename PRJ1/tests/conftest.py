@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of PRJ1 import each other by their flat names, as when run from PRJ1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+import logging
+
+import pytest
+
+from ai import AI
+from game_state import GameState
+from packed_state import PackedGameState
+from notation import position_from_text
+
+# player 2 to move has a single move, and every line 3 plies deep leaves them without a stack move while
+# player 1 can still play, so every root move scores -inf
+ALL_LINES_LOST = '8/1(oxoox)6/(ooxox)7/3(oxxx)4/(xoxoo)6(xox)/8/(xxxxx)6(ooooo)/7x 2'
+
+
+@pytest.mark.parametrize('strategy', ['MiniMax', 'AlphaBeta'])
+def test_timed_search_keeps_a_move_when_every_root_move_scores_minus_infinity(strategy):
+    state, player_number = position_from_text(ALL_LINES_LOST)
+    ai = AI(strategy, 200, opening_book=False, endgame_solver=False)
+    assert ai.choose_move(state, player_number) in state.get_legal_moves(player_number)
+
+
+@pytest.mark.parametrize('strategy', ['MiniMax', 'AlphaBeta'])
+def test_fixed_depth_search_returns_a_legal_move_when_every_root_move_scores_minus_infinity(strategy):
+    state, player_number = position_from_text(ALL_LINES_LOST)
+    ai = AI(strategy, 'Hard', opening_book=False, endgame_solver=False)
+    assert ai.choose_move(state, player_number) in state.get_legal_moves(player_number)
+
+
+def test_ponder_keeps_the_last_move_statistics_and_logs_no_moves(caplog):
+    ai = AI('AlphaBeta', 'Easy', opening_book=False, endgame_solver=False)
+    state = GameState()
+    state.make_move(ai.choose_move(state, 1), 1)
+    stats = ai.search_stats()
+    with caplog.at_level(logging.INFO, logger='ia'):
+        ai.ponder(state, 1)
+    assert ai.search_stats() == stats
+    assert not caplog.records
+    reply = state.get_legal_moves(2)[0]
+    state.make_move(reply, 2)
+    ai.choose_move(state, 1)
+    assert ai.ponder_hit
+
+
+def test_root_parallel_mcts_counts_every_playout_once():
+    # with one playout per share, some pool process usually runs two shares of the same search on one tree;
+    # a new AI each time, the trees of an earlier search would be reused on purpose
+    for _ in range(3):
+        ai = AI('MCTS', mcts_iterations=8, mcts_workers=8)
+        try:
+            statistics = ai.run_mcts_root_parallel(PackedGameState(), 1, 8)
+        finally:
+            ai.close()
+        assert sum(visits for _, visits in statistics.values()) == ai.playouts == 8
@@ -0,0 +1,11 @@
+import pytest
+
+from endgame import EndgameSolver, LOSS
+from notation import position_from_text
+
+
+@pytest.mark.parametrize('text', ['8/8/2(oooxx)5/1x6/8/8/8/8 2', '8/8/2(oooxx)5/1x6/8/8/8/o7 2'])
+def test_position_without_a_stack_move_is_a_loss(text):
+    # player 2 has no stack on the board, with and without a piece in reserve
+    state, player_number = position_from_text(text)
+    assert EndgameSolver().solve(state, player_number) == (LOSS, None)
@@ -0,0 +1,39 @@
+import os
+import random
+
+import pytest
+
+from game_state import GameState
+from packed_state import PackedGameState
+from perft import ENGINES, SUITE_POSITIONS, ReferenceEngine, compare, frozen, load_suite_positions
+from zobrist import board_hash
+
+SUITE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SUITE_POSITIONS)
+POSITIONS = [(name, state.board, player_number)
+             for name, _, state, player_number in load_suite_positions(SUITE_PATH, GameState)]
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('name, board, player_number', POSITIONS, ids=[name for name, _, _ in POSITIONS])
+def test_engine_agrees_with_the_reference_rules(engine, name, board, player_number):
+    # moves, game over, boards after every move and undo, incremental hash and features, two plies deep;
+    # compare raises perft.Divergence at the first difference
+    for depth in (1, 2):
+        compare(ReferenceEngine(), ENGINES[engine](), board, player_number, depth)
+
+
+@pytest.mark.parametrize('new_state', [GameState, PackedGameState])
+def test_push_pop_round_trip_keeps_the_hash_in_sync(new_state):
+    rng = random.Random(0)
+    state = new_state()
+    start_board, start_hash = frozen(state.board), state.hash
+    player_number, plies = 1, 0
+    while plies < 60 and state.has_valid_moves(player_number):
+        state.push_move(rng.choice(state.get_legal_moves(player_number)), player_number)
+        state.check_features()
+        assert state.hash == board_hash(state.board)
+        player_number, plies = 3 - player_number, plies + 1
+    for _ in range(plies):
+        state.pop_move()
+    assert frozen(state.board) == start_board
+    assert state.hash == start_hash == board_hash(state.board)
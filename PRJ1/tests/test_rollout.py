@@ -0,0 +1,26 @@
+import random
+
+import pytest
+
+from ai import AI
+from game_state import GameState
+from packed_state import PackedGameState
+from rollout import BatchRollouts
+
+
+@pytest.mark.parametrize('temperature', [1.0, 0.01])
+def test_heuristic_playouts_at_low_temperature(temperature):
+    # evaluation deltas of up to 120 points used to overflow exp() below a temperature of about 1
+    random.seed(0)
+    ai = AI('MCTS', mcts_playout='heuristic', playout_temperature=temperature, mcts_iterations=5, opening_book=False)
+    assert ai.choose_move(GameState(), 1) in GameState().get_legal_moves(1)
+    results = BatchRollouts(seed=0, policy='heuristic', temperature=temperature).run(PackedGameState(), 1, 1, 4)
+    assert len(results) == 4
+
+
+@pytest.mark.parametrize('temperature', [0, -1.0])
+def test_non_positive_temperature_is_rejected(temperature):
+    with pytest.raises(ValueError):
+        AI('MCTS', playout_temperature=temperature)
+    with pytest.raises(ValueError):
+        BatchRollouts(policy='heuristic', temperature=temperature)
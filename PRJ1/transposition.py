@@ -0,0 +1,90 @@
+EXACT = 0
+LOWER_BOUND = 1  # search failed high, the real value is >= stored value
+UPPER_BOUND = 2  # search failed low, the real value is <= stored value
+
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table for the alpha-beta search, indexed by the low bits of the Zobrist key.
+
+    Every slot holds one entry. A slot is overwritten when it belongs to an older search (see new_search)
+    or when the new result was searched at least as deep as the stored one (depth-preferred replacement).
+    """
+
+    def __init__(self, size=1 << 16):
+        # round up to a power of two so the slot is just key & mask
+        self.size = 1 << max(size - 1, 1).bit_length()
+        self.mask = self.size - 1
+        self.keys = [None] * self.size
+        self.depths = [-1] * self.size
+        self.values = [0.0] * self.size
+        self.flags = [EXACT] * self.size
+        self.best_moves = [None] * self.size
+        self.generations = [0] * self.size
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.overwrites = 0
+        self.rejected = 0
+
+    def new_search(self):
+        # entries from earlier moves are still used, but no longer protected by their depth
+        self.generation += 1
+
+    def clear(self):
+        self.__init__(self.size)
+
+    def probe(self, key, depth):
+        # returns (value, flag, best_move) for an entry searched at least `depth` deep, None otherwise
+        self.probes += 1
+        slot = key & self.mask
+        if self.keys[slot] != key or self.depths[slot] < depth:
+            return None
+        self.hits += 1
+        return self.values[slot], self.flags[slot], self.best_moves[slot]
+
+    def best_move(self, key):
+        # stored move for the key whatever its depth, for move ordering
+        slot = key & self.mask
+        return self.best_moves[slot] if self.keys[slot] == key else None
+
+    def store(self, key, depth, value, flag, best_move=None):
+        slot = key & self.mask
+        stored_key = self.keys[slot]
+        if stored_key is not None and self.generations[slot] == self.generation and self.depths[slot] > depth:
+            self.rejected += 1
+            return
+        if stored_key is not None and stored_key != key:
+            self.overwrites += 1
+        self.stores += 1
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.values[slot] = value
+        self.flags[slot] = flag
+        self.best_moves[slot] = best_move
+        self.generations[slot] = self.generation
+
+    def stats(self):
+        used = sum(1 for key in self.keys if key is not None)
+        return {
+            'size': self.size,
+            'used': used,
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+            'cutoffs': self.cutoffs,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+            'rejected': self.rejected,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return (f"TT {stats['used']}/{stats['size']} slots used, {stats['probes']} probes, "
+                f"hit rate {stats['hit_rate']:.1%}, {stats['cutoffs']} cutoffs, "
+                f"{stats['overwrites']} overwrites, {stats['rejected']} rejected stores")
@@ -0,0 +1,161 @@
+"""
+Headless self-play tuning of the evaluation weights (evaluation.FEATURES).
+
+texel:  self-play games with the current weights run in a process pool, every position is labelled with
+        the final result (1 win, 0.5 unfinished, 0 loss) and the weights are fitted with NumPy so that
+        sigmoid(k * evaluation) predicts the label (Texel tuning).
+evolve: (1 + population) evolutionary search, every mutated weight vector plays a match against the
+        current one with colours alternated and replaces it when it scores above --accept.
+
+python3 tune.py texel --games 200 --workers 4 --output weights.json
+python3 tune.py evolve --generations 20 --games 16 --workers 4 --output weights.json
+The result is loaded with AI(evaluation_weights='weights.json').
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import match
+from evaluation import FEATURES, DEFAULT_WEIGHTS, features, load_weights, save_weights
+from packed_state import PackedGameState
+
+MAX_GAME_PLIES = 200
+OPENING_PLIES = 8  # random moves before the players take over, so the games differ
+
+
+def play_game(weights_1, weights_2, seed, strategy='AlphaBeta', difficulty='Easy', record=False):
+    # One match.play_game between two weight vectors. Returns (score of player 1: 1, 0.5 or 0, positions) where
+    # positions holds (features for player 1, features for player 2) of every searched position when record is set.
+    configs = [{'strategy': strategy, 'difficulty': difficulty, 'evaluation_weights': weights}
+               for weights in (weights_1, weights_2)]
+    game = match.play_game(*configs, seed, OPENING_PLIES + MAX_GAME_PLIES, OPENING_PLIES)
+    positions = []
+    if record:
+        state = PackedGameState()
+        for ply, move in enumerate(game['moves']):
+            player_number = 1 if ply % 2 == 0 else 2
+            if ply >= OPENING_PLIES:
+                positions.append((features(state, 1), features(state, 2)))
+            state.make_move(move, player_number)
+    return game['result'], positions
+
+
+def collect_positions(pool, weights, games, seed, strategy, difficulty):
+    # (features, labels) of every position of `games` self-play games, from both players' side
+    futures = [pool.submit(play_game, weights, weights, seed + game, strategy, difficulty, record=True)
+               for game in range(games)]
+    rows, labels = [], []
+    for future in futures:
+        score, positions = future.result()
+        for features_1, features_2 in positions:
+            rows.extend((features_1, features_2))
+            labels.extend((score, 1 - score))
+    return np.array(rows, dtype=float), np.array(labels)
+
+
+def texel_error(rows, labels, weights, k):
+    return float(np.mean((labels - 1 / (1 + np.exp(-k * (rows @ weights)))) ** 2))
+
+
+def fit_texel(rows, labels, weights, iterations=2000, learning_rate=1.0):
+    # k is chosen once for the starting weights, then plain gradient descent on the mean squared error,
+    # in feature units scaled to unit deviation so the counts and the reserve heights move alike
+    weights = np.array(weights, dtype=float)
+    k = min((10.0 ** exponent for exponent in np.arange(-4, 0.01, 0.25)),
+            key=lambda candidate: texel_error(rows, labels, weights, candidate))
+    scale = rows.std(axis=0)
+    scale[scale == 0] = 1.0
+    scaled_rows, scaled_weights = rows / scale, weights * scale
+    for _ in range(iterations):
+        predictions = 1 / (1 + np.exp(-k * (scaled_rows @ scaled_weights)))
+        # gradient of the error divided by k, so the step size does not depend on it
+        gradient = -2 * ((labels - predictions) * predictions * (1 - predictions)) @ scaled_rows / len(labels)
+        scaled_weights -= learning_rate * gradient
+    fitted = scaled_weights / scale
+    return fitted, k, texel_error(rows, labels, weights, k), texel_error(rows, labels, fitted, k)
+
+
+def play_match(pool, candidate, incumbent, games, seed, strategy, difficulty):
+    # candidate's average score against the incumbent, colours alternated
+    futures = [pool.submit(play_game, *((candidate, incumbent) if game % 2 == 0 else (incumbent, candidate)),
+                           seed + game // 2, strategy, difficulty)
+               for game in range(games)]
+    scores = [future.result()[0] for future in futures]
+    return sum(score if game % 2 == 0 else 1 - score for game, score in enumerate(scores)) / games
+
+
+def mutate(weights, sigma, rng):
+    return tuple(weight + rng.gauss(0, sigma * max(abs(weight), 5.0)) for weight in weights)
+
+
+def evolve(pool, weights, generations, population, games, sigma, accept, seed, strategy, difficulty):
+    rng = random.Random(seed)
+    for generation in range(generations):
+        candidates = [mutate(weights, sigma, rng) for _ in range(population)]
+        scores = [play_match(pool, candidate, weights, games, seed + generation * games, strategy, difficulty)
+                  for candidate in candidates]
+        best = max(range(population), key=scores.__getitem__)
+        accepted = scores[best] > accept
+        if accepted:
+            weights = candidates[best]
+        print(f"generation {generation + 1}: best score {scores[best]:.2f}{' accepted' if accepted else ''}")
+    return weights
+
+
+def print_weights(start, weights):
+    for name, before, after in zip(FEATURES, start, weights):
+        print(f"{name:<18} {before:8.2f} -> {after:8.2f}")
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--weights', help='start from a weights file instead of the defaults')
+    common.add_argument('--output', help='write the tuned weights to this JSON file')
+    common.add_argument('--workers', type=int, default=4)
+    common.add_argument('--seed', type=int, default=1)
+    common.add_argument('--strategy', default='AlphaBeta', choices=['AlphaBeta'],
+                        help='the strategy whose leaves evaluation_weights score; MiniMax uses evaluate_state_simpler')
+    common.add_argument('--difficulty', default='Easy', choices=['Easy', 'Medium', 'Hard'])
+    parser = argparse.ArgumentParser(description='Self-play tuning of the evaluation weights')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    texel_parser = subparsers.add_parser('texel', parents=[common], help='fit the weights to self-play results')
+    texel_parser.add_argument('--games', type=int, default=200)
+    texel_parser.add_argument('--iterations', type=int, default=2000)
+
+    evolve_parser = subparsers.add_parser('evolve', parents=[common],
+                                          help='keep mutations that win matches against the current weights')
+    evolve_parser.add_argument('--generations', type=int, default=20)
+    evolve_parser.add_argument('--population', type=int, default=4)
+    evolve_parser.add_argument('--games', type=int, default=16, help='games per match, colours alternated')
+    evolve_parser.add_argument('--sigma', type=float, default=0.2, help='relative mutation size')
+    evolve_parser.add_argument('--accept', type=float, default=0.55, help='match score a mutation needs')
+
+    args = parser.parse_args()
+    start_weights = load_weights(args.weights) if args.weights else DEFAULT_WEIGHTS
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        if args.command == 'texel':
+            rows, labels = collect_positions(pool, start_weights, args.games, args.seed, args.strategy,
+                                             args.difficulty)
+            print(f"{args.games} games, {len(rows)} positions, {np.mean(labels == 0.5):.0%} unfinished")
+            weights, k, error_before, error_after = fit_texel(rows, labels, start_weights, args.iterations)
+            weights = tuple(float(weight) for weight in weights)
+            print(f"k {k:.4g}, error {error_before:.4f} -> {error_after:.4f}")
+            info = {'method': 'texel', 'games': args.games, 'positions': len(rows), 'k': k, 'error': error_after}
+        else:
+            weights = evolve(pool, start_weights, args.generations, args.population, args.games, args.sigma,
+                             args.accept, args.seed, args.strategy, args.difficulty)
+            info = {'method': 'evolve', 'generations': args.generations, 'population': args.population,
+                    'games': args.games}
+    print_weights(start_weights, weights)
+    print(f"done in {time.perf_counter() - start:.0f}s")
+    if args.output:
+        save_weights(args.output, weights, strategy=args.strategy, difficulty=args.difficulty, **info)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import random
+
+BOARD_CELLS = 64
+MAX_LEVELS = 16  # stacks are at most 5 high once redistributed, but reach 10 for a moment inside make_move
+
+# Fixed seed so the same position always gets the same hash, between runs and between engines
+_rng = random.Random(0x5A0B)
+
+# PIECE_KEYS[cell index][level][piece], piece 0 (no piece) is always 0
+PIECE_KEYS = [[(0, _rng.getrandbits(64), _rng.getrandbits(64)) for _ in range(MAX_LEVELS)]
+              for _ in range(BOARD_CELLS)]
+SIDE_KEYS = (0, _rng.getrandbits(64), _rng.getrandbits(64))  # player to move
+PERSPECTIVE_KEYS = (0, _rng.getrandbits(64), _rng.getrandbits(64))  # player the search values are scored for
+
+
+def stack_hash(index, stack):
+    keys = PIECE_KEYS[index]
+    h = 0
+    for level, piece in enumerate(stack):
+        h ^= keys[level][piece]
+    return h
+
+
+def board_hash(board):
+    h = 0
+    size = len(board)
+    for row in range(size):
+        for col in range(size):
+            h ^= stack_hash(row * size + col, board[row][col])
+    return h
+
+
+def search_key(position_hash, side_to_move, player_number):
+    return position_hash ^ SIDE_KEYS[side_to_move] ^ PERSPECTIVE_KEYS[player_number]
+
+
+def _packed_cell_keys():
+    # BYTE_KEYS[cell index][packed byte] for PackedGameState, equal to stack_hash of the decoded stack
+    table = []
+    for index in range(BOARD_CELLS):
+        keys = []
+        for value in range(256):
+            height = value >> 5
+            keys.append(stack_hash(index, [2 if (value >> k) & 1 else 1 for k in range(min(height, 5))]))
+        table.append(keys)
+    return table
+
+
+BYTE_KEYS = _packed_cell_keys()